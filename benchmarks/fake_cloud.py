@@ -0,0 +1,214 @@
+"""Local stand-in for the Connect Mesh cloud API, for benchmarks."""
+from __future__ import annotations
+
+import asyncio
+import random
+import ssl
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from aiohttp import web
+
+NETWORK_ID = "benchmark-network"
+ABSTRACTIONS = ("Light", "Multiwhite", "RGB", "OnOff")
+
+
+@dataclass
+class FakeCloudConfig:
+    """How the fake cloud behaves."""
+
+    device_count: int = 10
+    network_count: int = 1
+    latency: float = 0.05
+    jitter: float = 0.02
+    slow_rate: float = 0.0
+    slow_latency: float = 2.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    mesh_latency: float = 0.0
+    loss_rate: float = 0.0
+    etags: bool = True
+    seed: int = 0
+
+
+class FakeConnectMeshCloud:
+    """Serve the part of /api/core the integration uses.
+
+    Every request waits ``latency`` ± ``jitter`` seconds, and a share of
+    them (``slow_rate``) ``slow_latency`` seconds more, as a status read of
+    a slow mesh node would. A share of the requests fail with 500 (``error_rate``) or 429 (``rate_limit_rate``).
+    Commands change the state the status endpoint reports. Acknowledged
+    commands also wait ``mesh_latency`` seconds for the mesh, while a share
+    of the unacknowledged ones (``loss_rate``) never reach the device. When
+    ``event_sink`` is set, every state change is also pushed to it as an
+    event, standing in for a cloud that forwards changes to the webhook.
+    With ``etags``, the network and device lists carry an ETag and answer
+    a matching If-None-Match with 304.
+    """
+
+    def __init__(self, config: FakeCloudConfig):
+        """Create the devices of the fake network."""
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.requests: Counter[str] = Counter()
+        self.network_ids = [NETWORK_ID] + [f"{NETWORK_ID}-{index}" for index in range(1, config.network_count)]
+        self.devices = [
+            {
+                "uniqueId": f"device-{index:04d}",
+                "name": f"Device {index}",
+                "networkId": self.network_ids[index % len(self.network_ids)],
+            }
+            for index in range(config.device_count)
+        ]
+        self.statuses = {
+            device["uniqueId"]: {
+                "abstraction": ABSTRACTIONS[index % len(ABSTRACTIONS)],
+                "state": self._initial_state(ABSTRACTIONS[index % len(ABSTRACTIONS)]),
+            }
+            for index, device in enumerate(self.devices)
+        }
+        self.list_version = 0
+        self.url = ""
+        self.event_sink: Callable[[dict], Awaitable[None]] | None = None
+        self._runner: web.AppRunner | None = None
+
+    @staticmethod
+    def _initial_state(abstraction: str) -> dict:
+        """Return the state a new device reports."""
+        state: dict = {"power": False}
+        if abstraction != "OnOff":
+            state["lightness"] = 0
+        if abstraction == "Multiwhite":
+            state["temperature"] = 3000
+        elif abstraction == "RGB":
+            state.update(hue=0, saturation=0)
+        return state
+
+    async def start(self, ssl_context: ssl.SSLContext | None = None) -> str:
+        """Start serving on a free local port and return the API base URL.
+
+        With ``ssl_context``, the API is served over HTTPS.
+        """
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/api/core/networks", self._networks)
+        app.router.add_get("/api/core/devices", self._device_list)
+        app.router.add_get("/api/core/devices/{unique_id}/status", self._status)
+        for command in ("power", "lightness", "temperature", "hue_saturation"):
+            app.router.add_put(f"/api/core/devices/{command}", self._command)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0, ssl_context=ssl_context)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"{'https' if ssl_context else 'http'}://127.0.0.1:{port}/api/core"
+        return self.url
+
+    async def stop(self) -> None:
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        """Count the request, add latency and inject failures."""
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else "unknown"
+        self.requests[f"{request.method} {route}"] += 1
+        delay = self.config.latency + self.random.uniform(-self.config.jitter, self.config.jitter)
+        if self.config.slow_rate and self.random.random() < self.config.slow_rate:
+            self.requests["slow"] += 1
+            delay += self.config.slow_latency
+        await asyncio.sleep(max(0.0, delay))
+        roll = self.random.random()
+        if roll < self.config.error_rate:
+            self.requests["errors"] += 1
+            return web.Response(status=500)
+        if roll < self.config.error_rate + self.config.rate_limit_rate:
+            self.requests["rate_limited"] += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        return await handler(request)
+
+    def _list_response(self, request: web.Request, data: list) -> web.Response:
+        """Answer a list request, with 304 when the client has the current version."""
+        if not self.config.etags:
+            return web.json_response(data)
+        etag = f'"{self.list_version}"'
+        if request.headers.get("If-None-Match") == etag:
+            self.requests["not_modified"] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(data, headers={"ETag": etag})
+
+    async def _networks(self, request: web.Request) -> web.Response:
+        return self._list_response(request, [
+            {"id": network_id, "name": f"Benchmark network {index}"}
+            for index, network_id in enumerate(self.network_ids)
+        ])
+
+    async def _device_list(self, request: web.Request) -> web.Response:
+        return self._list_response(request, self.devices)
+
+    def add_device(self) -> str:
+        """Add a light to the first network, as pairing a new fixture would."""
+        unique_id = f"device-{self.config.device_count + self.list_version:04d}"
+        self.devices.append({"uniqueId": unique_id, "name": f"New device {unique_id}", "networkId": NETWORK_ID})
+        self.statuses[unique_id] = {"abstraction": "Light", "state": self._initial_state("Light")}
+        self.list_version += 1
+        return unique_id
+
+    def remove_device(self, unique_id: str) -> None:
+        """Remove a device from the account."""
+        self.devices = [device for device in self.devices if device["uniqueId"] != unique_id]
+        self.statuses.pop(unique_id, None)
+        self.list_version += 1
+
+    def rename_device(self, unique_id: str, name: str) -> None:
+        """Rename a device, as the app would."""
+        for device in self.devices:
+            if device["uniqueId"] == unique_id:
+                device["name"] = name
+        self.list_version += 1
+
+    async def _status(self, request: web.Request) -> web.Response:
+        if (status := self.statuses.get(request.match_info["unique_id"])) is None:
+            return web.Response(status=404)
+        return web.json_response(status)
+
+    async def _command(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if (status := self.statuses.get(body.get("uniqueId"))) is None:
+            return web.Response(status=404)
+        if body.get("acknowledged", True):
+            await asyncio.sleep(self.config.mesh_latency)
+        elif self.random.random() < self.config.loss_rate:
+            self.requests["lost"] += 1
+            return web.json_response({})
+        state = status["state"]
+        if "power" in body:
+            state["power"] = body["power"] == "on"
+        if "lightness" in body:
+            state["lightness"] = round(body["lightness"] * 65535)
+            state["power"] = body["lightness"] > 0
+        if "temperature" in body:
+            state["temperature"] = body["temperature"]
+        if "hue" in body:
+            state["hue"] = round(body["hue"])
+            state["saturation"] = round(body["saturation"] * 65535)
+        await self._push(body["uniqueId"])
+        return web.json_response({})
+
+    async def press_switch(self, unique_id: str) -> bool:
+        """Toggle a device as a wall switch would and return its new power."""
+        state = self.statuses[unique_id]["state"]
+        state["power"] = not state["power"]
+        await self._push(unique_id)
+        return state["power"]
+
+    async def _push(self, unique_id: str) -> None:
+        """Push the state of a device to the event sink, if any."""
+        if self.event_sink is not None:
+            await self.event_sink({"uniqueId": unique_id, **self.statuses[unique_id]})
+
+    @property
+    def total_requests(self) -> int:
+        """Return the number of requests served, failures included."""
+        return sum(count for key, count in self.requests.items() if " " in key)
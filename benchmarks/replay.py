@@ -0,0 +1,341 @@
+"""Replay a recorded Connect Mesh trace against the integration.
+
+A trace recorded with the ``hafele_connect_mesh.record_traffic`` service is
+served by a local stand-in cloud with the recorded latencies and failures,
+and its commands are sent again through Home Assistant at their recorded
+times. The integration polls as it would on its own, so two versions can be
+compared on the same production load, back to the first release: the
+stand-in cloud is served over HTTPS under the cloud's own host name, which
+resolves to it, and the config flow is driven by the fields each version
+asks for. Versions that only support one network get the first one.
+
+- ``poll s``: each refresh of one of the integration's coordinators,
+- ``ack s``: a light or switch service call until the cloud accepted it,
+- ``state s``: a service call until the entity shows the new power state.
+
+Example::
+
+    python benchmarks/replay.py trace.jsonl.gz --json new.json
+    python benchmarks/replay.py trace.jsonl.gz --repo ../hafele_connect_mesh-old --json old.json
+    python benchmarks/replay.py --compare old.json new.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import ssl
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from homeassistant import config_entries
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.util import ssl as ssl_util
+from yarl import URL
+
+from replay_cloud import ReplayConnectMeshCloud, load_trace
+from run import DOMAIN, INTEGRATION, REPO_ROOT, async_start_hass
+
+CLOUD_HOST = "cloud.connect-mesh.io"
+STATE_TIMEOUT = 30
+METRICS = ("poll_s", "ack_s", "state_s")
+
+
+def summarize(values: list[float]) -> dict:
+    """Return the count, mean and percentiles of durations."""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+def trace_commands(entries: list[dict]) -> list[tuple[float, str, dict]]:
+    """Return the time, device and body of each recorded command, retries left out."""
+    return sorted(
+        (entry["t"], entry["request"]["uniqueId"], entry["request"])
+        for entry in entries
+        if entry["method"] == "PUT" and not entry.get("attempt") and "uniqueId" in entry.get("request", {})
+    )
+
+
+def service_call(entity_id: str, body: dict) -> tuple[str, str, dict, bool]:
+    """Return the domain, service, data and expected power of a recorded command."""
+    domain = entity_id.split(".")[0]
+    if body.get("power") == "off" or body.get("lightness") == 0:
+        return domain, "turn_off", {"entity_id": entity_id}, False
+    data: dict = {"entity_id": entity_id}
+    if domain == "light":
+        if "lightness" in body:
+            data["brightness"] = max(1, round(body["lightness"] * 255))
+        if "temperature" in body:
+            data["color_temp_kelvin"] = body["temperature"]
+        if "hue" in body:
+            data["hs_color"] = (body["hue"] / 65535 * 360, body["saturation"] * 100)
+    return domain, "turn_on", data, True
+
+
+class CloudResolvingEventLoop(asyncio.SelectorEventLoop):
+    """Event loop resolving the cloud's host name to the stand-in cloud.
+
+    aiohttp resolves host names with the loop's getaddrinfo, so every
+    version of the integration connects to the stand-in with the cloud's
+    own URLs, whichever session it uses.
+    """
+
+    cloud_port: int | None = None
+
+    async def getaddrinfo(self, host, port, *args, **kwargs):
+        """Resolve the cloud to the stand-in, any other host as usual."""
+        if host == CLOUD_HOST and self.cloud_port is not None:
+            host, port = "127.0.0.1", self.cloud_port
+        return await super().getaddrinfo(host, port, *args, **kwargs)
+
+
+def cloud_ssl_context(directory: Path) -> ssl.SSLContext:
+    """Return a server context with a new certificate for the cloud's host name.
+
+    Home Assistant's client context, which the integration's sessions use,
+    is made to trust it.
+    """
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, CLOUD_HOST)])
+    now = datetime.now(timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(hours=1))
+        .not_valid_after(now + timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(CLOUD_HOST)]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    certificate_pem = certificate.public_bytes(serialization.Encoding.PEM)
+    (directory / "cloud.pem").write_bytes(certificate_pem)
+    (directory / "cloud.key").write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(directory / "cloud.pem", directory / "cloud.key")
+    ssl_util.get_default_context().load_verify_locations(cadata=certificate_pem.decode())
+    return context
+
+
+def time_polls(poll_times: list[float]):
+    """Return a patch timing the refreshes of the integration's coordinators."""
+    refresh = DataUpdateCoordinator._async_refresh
+
+    async def timed_refresh(coordinator, *args, **kwargs):
+        if not coordinator.logger.name.startswith(INTEGRATION):
+            return await refresh(coordinator, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await refresh(coordinator, *args, **kwargs)
+        finally:
+            poll_times.append(time.perf_counter() - started)
+
+    return patch.object(DataUpdateCoordinator, "_async_refresh", timed_refresh)
+
+
+async def async_add_entry(hass: HomeAssistant, cloud: ReplayConnectMeshCloud) -> None:
+    """Go through the config flow of whichever version is loaded, with every network it allows."""
+    result = await hass.config_entries.flow.async_init(DOMAIN, context={"source": config_entries.SOURCE_USER})
+    while result["type"] != "create_entry":
+        if result["type"] == "form":
+            fields = {str(key) for key in result["data_schema"].schema}
+            user_input = {}
+            if "api_token" in fields:
+                user_input["api_token"] = "replay"
+            if "networks" in fields:
+                user_input["networks"] = cloud.network_ids
+            if "network" in fields:
+                user_input["network"] = cloud.network_ids[0]
+            result = await hass.config_entries.flow.async_configure(result["flow_id"], user_input)
+        elif result["type"] == "progress":
+            await hass.async_block_till_done()
+            result = await hass.config_entries.flow.async_configure(result["flow_id"])
+        elif result["type"] == "progress_done":
+            result = await hass.config_entries.flow.async_configure(result["flow_id"])
+        elif result["type"] == "menu" and "finish" in result["menu_options"]:
+            # Some statuses failed: keep those devices as switches
+            result = await hass.config_entries.flow.async_configure(result["flow_id"], {"next_step_id": "finish"})
+        else:
+            raise RuntimeError(f"Config flow did not create an entry: {result}")
+    await hass.async_block_till_done()
+
+
+async def async_replay(args: argparse.Namespace) -> dict:
+    """Replay the trace against the integration of args.repo and return the measurements."""
+    header, entries = load_trace(args.trace)
+    cloud = ReplayConnectMeshCloud(entries)
+    with tempfile.TemporaryDirectory() as certificate_dir:
+        url = await cloud.start(cloud_ssl_context(Path(certificate_dir)))
+    asyncio.get_running_loop().cloud_port = URL(url).port
+    commands = trace_commands(entries)
+    duration = header["duration"] / args.speed
+    results: dict = {
+        "repo": str(args.repo),
+        "trace": str(args.trace),
+        "devices": len(cloud.devices),
+        "commands": len(commands),
+        "duration_s": duration,
+    }
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        os.symlink(args.repo.resolve() / "custom_components", Path(config_dir) / "custom_components")
+        sys.path.insert(0, config_dir)
+        try:
+            hass = await async_start_hass(config_dir)
+            poll_times: list[float] = []
+            with time_polls(poll_times):
+                try:
+                    await async_add_entry(hass, cloud)
+                    poll_times.clear()
+                    requests = cloud.total_requests
+                    ack_times, state_times = await async_replay_commands(hass, commands, duration, args.speed)
+                    results["requests"] = cloud.total_requests - requests
+                finally:
+                    await hass.async_stop(force=True)
+        finally:
+            sys.path.remove(config_dir)
+            await cloud.stop()
+
+    results["requests_per_s"] = results["requests"] / duration if duration else None
+    results["poll_s"] = summarize(poll_times)
+    results["ack_s"] = summarize(ack_times)
+    results["state_s"] = summarize(state_times)
+    results["state_timeouts"] = results["commands"] - len(state_times)
+    return results
+
+
+async def async_replay_commands(
+    hass: HomeAssistant, commands: list[tuple[float, str, dict]], duration: float, speed: float
+) -> tuple[list[float], list[float]]:
+    """Send the commands at their recorded times and return their ack and state times."""
+    registry = er.async_get(hass)
+    entity_ids = {
+        entry.unique_id: entry.entity_id
+        for entry in registry.entities.values()
+        if entry.platform == DOMAIN and entry.domain in ("light", "switch")
+    }
+    ack_times: list[float] = []
+    state_times: list[float] = []
+
+    async def async_send(unique_id: str, body: dict) -> None:
+        if (entity_id := entity_ids.get(unique_id)) is None:
+            return
+        domain, service, data, power = service_call(entity_id, body)
+        expected = "on" if power else "off"
+        started = time.perf_counter()
+        await hass.services.async_call(domain, service, data, blocking=True)
+        ack_times.append(time.perf_counter() - started)
+        while time.perf_counter() - started < STATE_TIMEOUT:
+            if (state := hass.states.get(entity_id)) is not None and state.state == expected:
+                state_times.append(time.perf_counter() - started)
+                return
+            await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    tasks = []
+    for offset, unique_id, body in commands:
+        if (delay := offset / speed - (time.perf_counter() - started)) > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(async_send(unique_id, body)))
+    if (remaining := duration - (time.perf_counter() - started)) > 0:
+        await asyncio.sleep(remaining)
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return ack_times, state_times
+
+
+def format_results(results: dict) -> str:
+    """Format the measurements of one replay as a table."""
+    lines = [
+        f"{results['repo']}: {results['devices']} devices, {results['commands']} commands, "
+        f"{results['duration_s']:.0f}s, {results['requests']} requests "
+        f"({results['requests_per_s']:.1f}/s), {results['state_timeouts']} states not shown",
+        f"{'metric':>8} {'count':>6} {'mean':>8} {'p50':>8} {'p95':>8} {'max':>8}",
+    ]
+    for metric in METRICS:
+        summary = results[metric]
+        values = [f"{summary[key]:8.3f}" if key in summary else f"{'-':>8}" for key in ("mean", "p50", "p95", "max")]
+        lines.append(f"{metric:>8} {summary['count']:>6} {' '.join(values)}")
+    return "\n".join(lines)
+
+
+def format_comparison(before: dict, after: dict) -> str:
+    """Format two replays of the same trace side by side."""
+    lines = [
+        f"before: {before['repo']}",
+        f"after:  {after['repo']}",
+        f"{'metric':>12} {'before':>9} {'after':>9} {'change':>8}",
+    ]
+    rows = [("requests/s", before["requests_per_s"], after["requests_per_s"])]
+    rows += [
+        (f"{metric} {key}", before[metric].get(key), after[metric].get(key))
+        for metric in METRICS
+        for key in ("p50", "p95")
+    ]
+    for name, old, new in rows:
+        change = f"{(new - old) / old:+8.0%}" if old and new is not None else f"{'-':>8}"
+        old_text = f"{old:9.3f}" if old is not None else f"{'-':>9}"
+        new_text = f"{new:9.3f}" if new is not None else f"{'-':>9}"
+        lines.append(f"{name:>12} {old_text} {new_text} {change}")
+    return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("trace", type=Path, nargs="?", help="trace written by the record_traffic service")
+    parser.add_argument("--repo", type=Path, default=REPO_ROOT,
+                        help="checkout whose custom_components to replay against (default: this one)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay the commands this many times faster")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two results written with --json instead of replaying")
+    parser.add_argument("--verbose", action="store_true", help="show Home Assistant warnings")
+    args = parser.parse_args()
+    if args.trace is None and args.compare is None:
+        parser.error("a trace or --compare is required")
+    return args
+
+
+async def async_main() -> None:
+    """Replay a trace, or compare two replays."""
+    args = parse_args()
+    if args.compare:
+        before, after = (json.loads(path.read_text()) for path in args.compare)
+        print(format_comparison(before, after))
+        return
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.ERROR)
+    print(f"Replaying {args.trace} against {args.repo}...", file=sys.stderr)
+    results = await async_replay(args)
+    print(format_results(results))
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    with asyncio.Runner(loop_factory=CloudResolvingEventLoop) as runner:
+        runner.run(async_main())
@@ -0,0 +1,115 @@
+"""Local stand-in for the Connect Mesh cloud serving a recorded trace."""
+from __future__ import annotations
+
+import asyncio
+import copy
+import gzip
+import json
+import statistics
+from collections import defaultdict
+from pathlib import Path
+
+from aiohttp import web
+
+from fake_cloud import FakeCloudConfig, FakeConnectMeshCloud
+
+TRACE_VERSION = 1
+API_PREFIX = "/api/core"
+
+
+def load_trace(path: Path) -> tuple[dict, list[dict]]:
+    """Return the header and attempts of a trace recorded by the integration."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        header, *entries = (json.loads(line) for line in file if line.strip())
+    if header.get("version") != TRACE_VERSION:
+        raise ValueError(f"Unsupported trace version: {header.get('version')}")
+    return header, entries
+
+
+def route_of(method: str, path: str) -> str:
+    """Return the route a request path is served by, as the stand-in counts it."""
+    parts = path.strip("/").split("/")
+    if len(parts) == 3 and parts[0] == "devices":
+        parts[1] = "{unique_id}"
+    return f"{method} {API_PREFIX}/{'/'.join(parts)}"
+
+
+class ReplayConnectMeshCloud(FakeConnectMeshCloud):
+    """Serve the account and the request outcomes of a recorded trace.
+
+    Networks, devices and their first known states come from the trace.
+    Each request takes the outcome of the next attempt recorded on its
+    route, in recorded order and starting over when they run out: it
+    waits the recorded latency, then fails as recorded or is answered from
+    the modelled device states, which commands change as on the fake
+    cloud. Reads and commands stay consistent whatever the integration
+    version asks for, while latency and failures follow production.
+    """
+
+    def __init__(self, entries: list[dict]):
+        """Build the account and the outcomes of each route from a trace."""
+        super().__init__(FakeCloudConfig(device_count=0, latency=0, jitter=0))
+        self.outcomes: defaultdict[str, list[tuple[int, float, str | None]]] = defaultdict(list)
+        self._positions: defaultdict[str, int] = defaultdict(int)
+        networks = devices = None
+        device_ids: dict[str, None] = {}
+        for entry in entries:
+            method, path, response = entry["method"], entry["path"], entry.get("response")
+            self.outcomes[route_of(method, path)].append((entry["status"], entry["latency"], entry.get("error")))
+            parts = path.strip("/").split("/")
+            if len(parts) == 3 and parts[0] == "devices":
+                device_ids.setdefault(parts[1])
+                if entry["status"] == 200 and response is not None:
+                    self.statuses.setdefault(parts[1], copy.deepcopy(response))
+            elif path == "/networks" and networks is None and entry["status"] == 200:
+                networks = response
+            elif path == "/devices" and devices is None and entry["status"] == 200:
+                devices = response
+            if (unique_id := (entry.get("request") or {}).get("uniqueId")) is not None:
+                device_ids.setdefault(unique_id)
+
+        if networks:
+            self.network_ids = [network["id"] for network in networks]
+        else:
+            self.network_ids = sorted({device["networkId"] for device in devices or () if "networkId" in device})
+            self.network_ids = self.network_ids or ["network-1"]
+        if devices is None:
+            # Recorded after setup: only the devices that were read or commanded are known
+            devices = [{"uniqueId": unique_id, "name": unique_id} for unique_id in device_ids]
+        self.devices = [
+            {**device, "networkId": device.get("networkId") or self.network_ids[0]}
+            for device in devices
+            if device.get("networkId", self.network_ids[0]) in self.network_ids
+        ]
+        for device in self.devices:
+            self.statuses.setdefault(device["uniqueId"], {"abstraction": "Light", "state": self._initial_state("Light")})
+        successes = [latency for outcomes in self.outcomes.values() for status, latency, _ in outcomes if status == 200]
+        self.default_latency = statistics.median(successes) if successes else 0.05
+
+    def next_outcome(self, route: str) -> tuple[int, float, str | None]:
+        """Return the next recorded outcome of a route, a success for an unrecorded one."""
+        if not (outcomes := self.outcomes.get(route)):
+            return 200, self.default_latency, None
+        position = self._positions[route]
+        self._positions[route] = position + 1
+        return outcomes[position % len(outcomes)]
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        """Count the request and replay the outcome recorded for its route."""
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else "unknown"
+        key = f"{request.method} {route}"
+        self.requests[key] += 1
+        status, latency, error = self.next_outcome(key)
+        await asyncio.sleep(latency)
+        if error is not None:
+            # The client gave up or lost the connection: it no longer waits for an answer
+            self.requests["errors"] += 1
+            return web.Response(status=503)
+        if status == 429:
+            self.requests["rate_limited"] += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        if status >= 400:
+            self.requests["errors"] += 1
+            return web.Response(status=status)
+        return await handler(request)
@@ -0,0 +1,396 @@
+"""Benchmark the Häfele Connect Mesh integration against a local fake cloud.
+
+Runs a minimal Home Assistant instance with the integration loaded from
+this repository and reports, for each network size:
+
+- the config flow time (discovery, classification and entry setup),
+- cold and warm (snapshot) setup times,
+- the wall time (median and 99th percentile) and request count of a full
+  poll cycle and of an idle one, with the devices spread over ``--networks``
+  networks polled concurrently, and the status reads hedged in the cycles,
+- the raw ``ConnectMeshAPI.get_device_statuses`` time,
+- the command round trip: service call to acknowledgement, and to the
+  device state being confirmed by a status read, and the acknowledgement
+  time again while a full poll cycle is queued,
+- with ``--events``, the time from a change made outside Home Assistant
+  to its state, with the fake cloud pushing events to the webhook.
+
+With ``--record``, the integration's traffic is also written to a trace per
+size, which ``replay.py`` can serve again.
+
+Example::
+
+    python benchmarks/run.py --devices 10,100,1000 --networks 2 --latency 0.05 --rate-limit 200
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from homeassistant import auth, bootstrap, config_entries, loader
+from homeassistant.components import webhook
+from homeassistant.const import EVENT_HOMEASSISTANT_FINAL_WRITE
+from homeassistant.core import CoreState, HomeAssistant
+from homeassistant.helpers import entity_registry as er
+from homeassistant.setup import async_setup_component
+from homeassistant.util.aiohttp import MockRequest
+
+from fake_cloud import FakeCloudConfig, FakeConnectMeshCloud
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DOMAIN = "hafele_connect_mesh"
+INTEGRATION = f"custom_components.{DOMAIN}"
+
+
+async def async_start_hass(config_dir: str) -> HomeAssistant:
+    """Start a bare Home Assistant that loads custom integrations from config_dir."""
+    hass = HomeAssistant(config_dir)
+    hass.config.skip_pip = True
+    loader.async_setup(hass)
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    # Registries, translations and config entries, as on a normal start
+    await bootstrap.async_load_base_functionality(hass)
+    # The webhook the integration registers needs the HTTP server and auth
+    hass.auth = await auth.auth_manager_from_config(hass, [], [])
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    await async_setup_component(hass, "http", {"http": {"server_host": ["127.0.0.1"], "server_port": port}})
+    hass.set_state(CoreState.running)
+    return hass
+
+
+async def async_wait(condition, timeout: float = 120) -> float:
+    """Wait until condition() is true and return the time it took."""
+    started = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError("Benchmark condition not reached")
+        await asyncio.sleep(0.005)
+    return time.perf_counter() - started
+
+
+async def async_run_config_flow(
+    hass: HomeAssistant, cloud: FakeConnectMeshCloud
+) -> tuple[float, config_entries.ConfigEntry]:
+    """Go through the config flow, selecting every network, and return its duration and the entry."""
+    started = time.perf_counter()
+    result = await hass.config_entries.flow.async_init(DOMAIN, context={"source": config_entries.SOURCE_USER})
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], {"api_token": "benchmark"})
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], {"networks": cloud.network_ids})
+    while result["type"] == "progress":
+        await hass.async_block_till_done()
+        result = await hass.config_entries.flow.async_configure(result["flow_id"])
+    if result["type"] == "progress_done":
+        result = await hass.config_entries.flow.async_configure(result["flow_id"])
+    if result["type"] == "menu":
+        # Some statuses failed (error injection): keep them as switches
+        result = await hass.config_entries.flow.async_configure(result["flow_id"], {"next_step_id": "finish"})
+    if result["type"] != "create_entry":
+        raise RuntimeError(f"Config flow did not create an entry: {result}")
+    await hass.async_block_till_done()
+    return time.perf_counter() - started, result["result"]
+
+
+async def async_bench_size(args: argparse.Namespace, device_count: int) -> dict:
+    """Benchmark one network size and return the measurements."""
+    cloud = FakeConnectMeshCloud(FakeCloudConfig(
+        device_count=device_count,
+        network_count=args.networks,
+        latency=args.latency,
+        jitter=args.jitter,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limited_rate,
+        mesh_latency=args.mesh_latency,
+        loss_rate=args.loss_rate,
+    ))
+    url = await cloud.start()
+    results: dict = {"devices": device_count, "networks": args.networks}
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        os.symlink(REPO_ROOT / "custom_components", Path(config_dir) / "custom_components")
+        sys.path.insert(0, config_dir)
+        try:
+            hass = await async_start_hass(config_dir)
+            api_module = __import__(f"{INTEGRATION}.api", fromlist=["api"])
+            coordinator_module = __import__(f"{INTEGRATION}.coordinator", fromlist=["coordinator"])
+            patches = [patch.object(api_module, "API_BASE_URL", url)]
+            if args.no_hedge:
+                patches += [patch.object(api_module, name, 0) for name in ("HEDGE_BUDGET", "HEDGE_BURST")]
+            if args.rate_limit:
+                # The registry creates the rate limiter shared by an account's clients
+                patches += [
+                    patch.object(module, name, args.rate_limit)
+                    for module in (api_module, coordinator_module)
+                    for name in ("DEFAULT_RATE_LIMIT", "DEFAULT_RATE_BURST")
+                ]
+            for active in patches:
+                active.start()
+            if args.record:
+                trace_module = __import__(f"{INTEGRATION}.trace", fromlist=["trace"])
+                recorder = trace_module.TrafficRecorder()
+                coordinator_module.async_get_registry(hass).async_set_recorder(recorder)
+            try:
+                await async_bench_integration(hass, cloud, args, results)
+                if args.record:
+                    recorder.write(args.record / f"trace-{device_count}.jsonl.gz")
+            finally:
+                await hass.async_stop(force=True)
+                for active in patches:
+                    active.stop()
+        finally:
+            sys.path.remove(config_dir)
+            await cloud.stop()
+    return results
+
+
+async def async_bench_integration(
+    hass: HomeAssistant, cloud: FakeConnectMeshCloud, args: argparse.Namespace, results: dict
+) -> None:
+    """Run every measurement on a started Home Assistant."""
+    requests = cloud.total_requests
+    results["config_flow_s"], entry = await async_run_config_flow(hass, cloud)
+    results["config_flow_requests"] = cloud.total_requests - requests
+    options = {}
+    if args.fast_commands:
+        options["fast_commands"] = True
+    if args.poll_rate:
+        options["max_poll_rate"] = args.poll_rate
+    if options:
+        # The options listener reloads the entry
+        hass.config_entries.async_update_entry(entry, options={**entry.options, **options})
+        await hass.async_block_till_done()
+
+    coordinators = list(hass.data[DOMAIN][entry.entry_id]["coordinators"].values())
+    if args.events:
+        async def async_push(event: dict) -> None:
+            request = MockRequest(json.dumps(event).encode(), mock_source="fake cloud", method="POST")
+            await webhook.async_handle_webhook(hass, entry.data["webhook_id"], request)
+
+        cloud.event_sink = async_push
+
+    async def async_refresh_all() -> None:
+        await asyncio.gather(*(coordinator.async_refresh() for coordinator in coordinators))
+
+    # Full poll cycle: every device of every network due, without the poll rate cap
+    poll_rates = [coordinator.poll_rate for coordinator in coordinators]
+    for coordinator in coordinators:
+        coordinator.poll_rate = None
+    cycle_times, cycle_requests = [], []
+    hedged = sum(coordinator.api_client.counters["hedged"] for coordinator in coordinators)
+    for _ in range(args.cycles):
+        for coordinator in coordinators:
+            coordinator.scheduler.forget(coordinator.device_ids)
+        requests = cloud.total_requests
+        started = time.perf_counter()
+        await async_refresh_all()
+        cycle_times.append(time.perf_counter() - started)
+        cycle_requests.append(cloud.total_requests - requests)
+    results["poll_cycle_s"] = statistics.median(cycle_times)
+    results["poll_cycle_p99_s"] = sorted(cycle_times)[min(len(cycle_times) - 1, int(len(cycle_times) * 0.99))]
+    results["poll_cycle_requests"] = statistics.median(cycle_requests)
+    results["poll_cycle_hedged"] = (
+        sum(coordinator.api_client.counters["hedged"] for coordinator in coordinators) - hedged
+    )
+    for coordinator, poll_rate in zip(coordinators, poll_rates):
+        coordinator.poll_rate = poll_rate
+
+    # One tick with every device due: the cap spreads the rest over later ticks
+    for coordinator in coordinators:
+        coordinator.scheduler.forget(coordinator.device_ids)
+    requests = cloud.total_requests
+    await async_refresh_all()
+    results["capped_tick_requests"] = cloud.total_requests - requests
+
+    # Idle cycle: nothing due, as between two polls of a quiet network
+    requests = cloud.total_requests
+    started = time.perf_counter()
+    await async_refresh_all()
+    results["idle_cycle_s"] = time.perf_counter() - started
+    results["idle_cycle_requests"] = cloud.total_requests - requests
+
+    # Raw API fan-out without the coordinators
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        coordinator.api_client.get_device_statuses(
+            coordinator.device_ids, max_concurrency=coordinator.max_concurrency
+        )
+        for coordinator in coordinators
+    ))
+    results["api_statuses_s"] = time.perf_counter() - started
+
+    # Command round trip through ConnectMeshLight
+    lights = [
+        state.entity_id for state in hass.states.async_all("light")
+        if state.state != "unavailable"
+    ][: args.commands]
+    acknowledged, confirmed = [], []
+    for entity_id in lights:
+        unique_id = er.async_get(hass).async_get(entity_id).unique_id
+        coordinator = next(c for c in coordinators if unique_id in c.device_ids)
+        started = time.perf_counter()
+        await hass.services.async_call("light", "turn_on", {"entity_id": entity_id, "brightness": 128}, blocking=True)
+        acknowledged.append(time.perf_counter() - started)
+        await async_wait(lambda: unique_id not in coordinator._pending)
+        confirmed.append(time.perf_counter() - started)
+    if lights:
+        results["command_ack_s"] = statistics.median(acknowledged)
+        results["command_confirmed_s"] = statistics.median(confirmed)
+        results["command_resends"] = sum(coordinator.command_resends for coordinator in coordinators)
+
+    # The same commands while a full poll cycle is queued
+    if lights:
+        for coordinator in coordinators:
+            coordinator.scheduler.forget(coordinator.device_ids)
+        cycle = asyncio.create_task(async_refresh_all())
+        await asyncio.sleep(0.1)
+        busy = []
+        for entity_id in lights:
+            started = time.perf_counter()
+            await hass.services.async_call("light", "turn_on", {"entity_id": entity_id, "brightness": 64}, blocking=True)
+            busy.append(time.perf_counter() - started)
+        results["command_ack_busy_s"] = statistics.median(busy)
+        await cycle
+
+    # External change (wall switch or app) until Home Assistant shows it
+    if args.events:
+        external = []
+        for entity_id in lights:
+            unique_id = er.async_get(hass).async_get(entity_id).unique_id
+            started = time.perf_counter()
+            expected = "on" if await cloud.press_switch(unique_id) else "off"
+            await async_wait(lambda: hass.states.get(entity_id).state == expected)
+            external.append(time.perf_counter() - started)
+        if external:
+            results["external_change_s"] = statistics.median(external)
+
+    # Device list reconciliation: unchanged, then with one device renamed, added and removed
+    reconciler = hass.data[DOMAIN][entry.entry_id]["reconciler"]
+    await reconciler.async_reconcile()
+    requests = cloud.total_requests
+    started = time.perf_counter()
+    await reconciler.async_reconcile()
+    results["reconcile_idle_s"] = time.perf_counter() - started
+    results["reconcile_idle_requests"] = cloud.total_requests - requests
+    cloud.rename_device(cloud.devices[0]["uniqueId"], "Renamed device")
+    cloud.remove_device(cloud.devices[-1]["uniqueId"])
+    cloud.add_device()
+    started = time.perf_counter()
+    await reconciler.async_reconcile()
+    await hass.async_block_till_done()
+    results["reconcile_s"] = time.perf_counter() - started
+
+    # Setup times: without snapshot, then from the snapshot
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_FINAL_WRITE)
+    await hass.async_block_till_done()
+    results["api_counters"] = {
+        coordinator.network_id: dict(coordinator.api_client.counters) for coordinator in coordinators
+    }
+    snapshots = [
+        Path(hass.config.path(".storage", f"{DOMAIN}.{network_id}")) for network_id in entry.data["network_ids"]
+    ]
+    for label, keep_snapshot in (("setup_cold_s", False), ("setup_warm_s", True)):
+        await hass.config_entries.async_unload(entry.entry_id)
+        if not keep_snapshot:
+            saved = {snapshot: snapshot.read_bytes() for snapshot in snapshots if snapshot.exists()}
+            for snapshot in snapshots:
+                snapshot.unlink(missing_ok=True)
+        started = time.perf_counter()
+        await hass.config_entries.async_setup(entry.entry_id)
+        results[label] = time.perf_counter() - started
+        await hass.async_block_till_done()
+        if not keep_snapshot:
+            for snapshot, content in saved.items():
+                snapshot.write_bytes(content)
+    # Cancels the background refresh of the warm setup before the session closes
+    await hass.config_entries.async_unload(entry.entry_id)
+
+
+def format_results(rows: list[dict]) -> str:
+    """Return the results as a text table."""
+    columns = [
+        ("devices", "devices", "{:d}"),
+        ("networks", "networks", "{:d}"),
+        ("config_flow_s", "flow s", "{:.2f}"),
+        ("setup_cold_s", "cold s", "{:.2f}"),
+        ("setup_warm_s", "warm s", "{:.3f}"),
+        ("poll_cycle_s", "cycle s", "{:.2f}"),
+        ("poll_cycle_p99_s", "p99 cycle s", "{:.2f}"),
+        ("poll_cycle_requests", "req/cycle", "{:.0f}"),
+        ("poll_cycle_hedged", "hedged", "{:d}"),
+        ("idle_cycle_requests", "req/idle", "{:.0f}"),
+        ("capped_tick_requests", "req/tick", "{:d}"),
+        ("api_statuses_s", "api s", "{:.2f}"),
+        ("command_ack_s", "ack s", "{:.3f}"),
+        ("command_confirmed_s", "confirm s", "{:.3f}"),
+        ("command_ack_busy_s", "busy ack s", "{:.3f}"),
+        ("command_resends", "resends", "{:d}"),
+        ("external_change_s", "external s", "{:.3f}"),
+        ("reconcile_idle_s", "recon idle s", "{:.3f}"),
+        ("reconcile_s", "recon s", "{:.3f}"),
+    ]
+    lines = ["  ".join(f"{title:>10}" for _, title, _ in columns)]
+    for row in rows:
+        lines.append("  ".join(
+            f"{fmt.format(row[key]):>10}" if key in row else f"{'-':>10}"
+            for key, _, fmt in columns
+        ))
+    return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--devices", default="10,100,1000", help="comma separated network sizes")
+    parser.add_argument("--networks", type=int, default=1, help="networks to spread the devices over")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean cloud latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="latency jitter in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests answered slowly")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="extra seconds of a slow answer")
+    parser.add_argument("--no-hedge", action="store_true", help="never hedge slow status reads")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 500")
+    parser.add_argument("--rate-limited-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="override the client rate limit (requests/s); default keeps the integration's")
+    parser.add_argument("--cycles", type=int, default=3, help="full poll cycles to measure")
+    parser.add_argument("--commands", type=int, default=5, help="light commands to measure")
+    parser.add_argument("--mesh-latency", type=float, default=0.0,
+                        help="extra seconds an acknowledged command waits for the mesh")
+    parser.add_argument("--loss-rate", type=float, default=0.0, help="share of unacknowledged commands lost")
+    parser.add_argument("--poll-rate", type=float, default=None, help="poll rate ceiling in requests/s")
+    parser.add_argument("--fast-commands", action="store_true", help="send commands unacknowledged")
+    parser.add_argument("--events", action="store_true",
+                        help="push state changes to the webhook and measure external changes")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    parser.add_argument("--record", type=Path, help="write the traffic of each size to a trace in this directory")
+    parser.add_argument("--verbose", action="store_true", help="show Home Assistant warnings")
+    return parser.parse_args()
+
+
+async def async_main() -> None:
+    """Run the benchmark for every requested size."""
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.ERROR)
+    rows = []
+    for device_count in (int(size) for size in args.devices.split(",")):
+        print(f"Benchmarking {device_count} devices...", file=sys.stderr)
+        rows.append(await async_bench_size(args, device_count))
+    print(format_results(rows))
+    if args.json:
+        args.json.write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(async_main())
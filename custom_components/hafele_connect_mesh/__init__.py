@@ -1,20 +1,49 @@
 """Häfele Connect Mesh integration for Home Assistant."""
 from __future__ import annotations
 
+import asyncio
 import logging
-from datetime import timedelta
-from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
-import aiohttp
+from functools import partial
+from typing import Any
 
-from .const import DOMAIN
+from homeassistant.components import webhook
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_WEBHOOK_ID
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.storage import Store
+
+from .api import ConnectMeshAPI
+from .const import (
+    CONF_COMMAND_MODE_OVERRIDES,
+    CONF_FAST_COMMANDS,
+    CONF_MAX_CONCURRENCY,
+    CONF_MAX_POLL_INTERVAL,
+    CONF_MAX_POLL_RATE,
+    CONF_MIN_POLL_INTERVAL,
+    CONF_STATUS_TIMEOUT,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MAX_POLL_RATE,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_STATUS_TIMEOUT,
+    DOMAIN,
+    PLATFORMS,
+    SIGNAL_DEVICES_CHANGED,
+    SNAPSHOT_STORAGE_VERSION,
+)
+from .coordinator import ConnectMeshCoordinator, async_get_registry, snapshot_storage_key
+from .events import WebhookEventSource
+from .models import DeviceChanges
+from .reconciler import DeviceReconciler
+from .services import async_setup_services, async_unload_services
+
+__all__ = ["ConnectMeshAPI"]
 
 _LOGGER = logging.getLogger(__name__)
 
-PLATFORMS = ["light"]
-
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Häfele Connect Mesh from a config entry."""
     # Check if this is a migrated entry
@@ -23,150 +52,184 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         new_data["api_token"] = entry.data["old_config"]["api_token"]
         hass.config_entries.async_update_entry(entry, data=new_data)
         _LOGGER.info("Migrated API token from old configuration")
-
-    session = async_get_clientsession(hass)
-    api_client = ConnectMeshAPI(session, entry.data["api_token"])
-    
-    async def async_update_data():
-        """Fetch data from API."""
-        devices = entry.data["devices"]
-        return {device["uniqueId"]: await api_client.get_device_status(device["uniqueId"]) for device in devices}
-
-    coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name="hafele_connect_mesh",
-        update_method=async_update_data,
-        update_interval=timedelta(seconds=30),
+    if CONF_WEBHOOK_ID not in entry.data:
+        hass.config_entries.async_update_entry(
+            entry, data={**entry.data, CONF_WEBHOOK_ID: webhook.async_generate_id()}
+        )
+
+    registry = async_get_registry(hass)
+    devices_by_network = _devices_by_network(entry.data["network_ids"], entry.data["devices"])
+
+    # Every network is polled by its own coordinator, so a large or failing
+    # network does not hold up the others
+    coordinators = {}
+    for network_id, device_ids in devices_by_network.items():
+        coordinator = registry.async_get_coordinator(entry.data["api_token"], network_id)
+        coordinator.async_add_consumer(
+            entry.entry_id,
+            device_ids,
+            max_concurrency=entry.options.get(CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY),
+            status_timeout=entry.options.get(CONF_STATUS_TIMEOUT, DEFAULT_STATUS_TIMEOUT),
+            min_poll_interval=entry.options.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL),
+            max_poll_interval=entry.options.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL),
+            max_poll_rate=entry.options.get(CONF_MAX_POLL_RATE, DEFAULT_MAX_POLL_RATE),
+            unacknowledged_devices=_unacknowledged_devices(entry, device_ids),
+        )
+        entry.async_on_unload(partial(registry.async_release, coordinator, entry.entry_id))
+        coordinators[network_id] = coordinator
+    registry.async_balance_poll_rates(entry.data["api_token"])
+
+    started = await asyncio.gather(*(
+        _async_start_coordinator(hass, entry, coordinator, devices_by_network[network_id])
+        for network_id, coordinator in coordinators.items()
+    ))
+    if not any(started):
+        raise ConfigEntryNotReady from next(iter(coordinators.values())).last_exception
+
+    @callback
+    def async_handle_events(statuses: dict[str, dict[str, Any]]) -> None:
+        for coordinator in coordinators.values():
+            coordinator.async_apply_events(statuses)
+
+    # Changes pushed to the webhook replace most of the polling
+    event_source = WebhookEventSource(hass, entry.data[CONF_WEBHOOK_ID], entry.title, async_handle_events)
+    await event_source.async_start()
+    entry.async_on_unload(event_source.async_stop)
+
+    @callback
+    def async_apply_devices(devices: list[dict], network_ids: list[str], changes: DeviceChanges) -> None:
+        """Apply a changed device list to the running entry."""
+        data = {**entry.data, "network_ids": network_ids, "devices": devices}
+        hass.data[DOMAIN][entry.entry_id].update(devices=devices, data=data)
+        # The running entry already matches, so the update listener does not reload it
+        hass.config_entries.async_update_entry(entry, data=data)
+        devices_by_network = _devices_by_network(network_ids, devices)
+        for network_id, coordinator in coordinators.items():
+            # A network gone from the account keeps an idle coordinator until the next reload
+            device_ids = devices_by_network.get(network_id, [])
+            coordinator.async_update_consumer(
+                entry.entry_id, device_ids, _unacknowledged_devices(entry, device_ids)
+            )
+            if not coordinator.has_statuses(device_ids):
+                hass.async_create_task(coordinator.async_request_refresh())
+        registry.async_balance_poll_rates(entry.data["api_token"])
+        async_dispatcher_send(hass, SIGNAL_DEVICES_CHANGED.format(entry.entry_id), changes)
+
+    # Devices added, removed or renamed in the app show up without a reload
+    reconciler = DeviceReconciler(
+        hass, entry, registry.async_get_api_client(entry.data["api_token"]), async_apply_devices
     )
-
-    await coordinator.async_config_entry_first_refresh()
+    await reconciler.async_start()
+    entry.async_on_unload(reconciler.async_stop)
 
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = {
-        "api_client": api_client,
-        "coordinator": coordinator,
-        "devices": entry.data["devices"]
+        "coordinators": coordinators,
+        "devices": entry.data["devices"],
+        "reconciler": reconciler,
+        # What the entry runs with, to tell its own updates from changes that need a reload
+        "data": dict(entry.data),
+        "options": dict(entry.options),
     }
     
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
-    
-    async def get_device_status(call: ServiceCall) -> None:
-        """Handle the service call."""
-        device_id = call.data["device_id"]
-        status = await api_client.get_device_status(device_id)
-        hass.states.async_set(f"{DOMAIN}.{device_id}_status", "retrieved", status)
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
 
-    hass.services.async_register(DOMAIN, "get_device_status", get_device_status)
+    async_setup_services(hass)
 
     return True
 
+def _devices_by_network(network_ids: list[str], devices: list[dict]) -> dict[str | None, list[str]]:
+    """Return the unique IDs of the devices of each network."""
+    devices_by_network: dict[str | None, list[str]] = {network_id: [] for network_id in network_ids}
+    for device in devices:
+        devices_by_network.setdefault(device.get("networkId"), []).append(device["uniqueId"])
+    return devices_by_network
+
+def _unacknowledged_devices(entry: ConfigEntry, device_ids: list[str]) -> list[str]:
+    """Return the devices whose commands are sent unacknowledged.
+
+    Fast mode sends commands unacknowledged; the overridden devices use the other mode.
+    """
+    fast_commands = entry.options.get(CONF_FAST_COMMANDS, False)
+    overrides = set(entry.options.get(CONF_COMMAND_MODE_OVERRIDES, []))
+    return [unique_id for unique_id in device_ids if (unique_id in overrides) is not fast_commands]
+
+async def _async_start_coordinator(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    coordinator: ConnectMeshCoordinator,
+    device_ids: list[str],
+) -> bool:
+    """Make the statuses of a network available and return False if that failed.
+
+    Starts from the statuses saved on the last run when they cover every
+    device and polls in the background, so startup does not wait for the
+    cloud. A network that fails keeps retrying on its own schedule.
+    """
+    if coordinator.has_statuses(device_ids):
+        return True
+    await coordinator.async_load_snapshot()
+    if coordinator.has_statuses(device_ids):
+        entry.async_create_background_task(
+            hass, coordinator.async_refresh(), f"{DOMAIN} first refresh {coordinator.network_id}"
+        )
+        return True
+    await coordinator.async_refresh()
+    if not coordinator.last_update_success:
+        _LOGGER.warning("Could not get the status of network %s: %s", coordinator.network_id, coordinator.last_exception)
+    return coordinator.last_update_success
+
+async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Migrate an entry to the current version."""
+    if entry.version < 3:
+        # One network per entry became a list of networks
+        data = dict(entry.data)
+        network_id = data.pop("network_id", None)
+        data["network_ids"] = [network_id]
+        data["devices"] = [{**device, "networkId": network_id} for device in data.get("devices", [])]
+
+        # The diagnostic sensors are now per network
+        @callback
+        def migrate_unique_id(entity_entry: er.RegistryEntry) -> dict[str, str] | None:
+            prefix = f"{entry.entry_id}_"
+            if entity_entry.domain != "sensor" or not entity_entry.unique_id.startswith(prefix):
+                return None
+            key = entity_entry.unique_id.removeprefix(prefix)
+            return {"new_unique_id": f"{entry.entry_id}_{network_id}_{key}"}
+
+        await er.async_migrate_entries(hass, entry.entry_id, migrate_unique_id)
+        hass.config_entries.async_update_entry(entry, data=data, version=3)
+        _LOGGER.info("Migrated config entry to version 3")
+    return True
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
+        if not hass.data[DOMAIN]:
+            async_unload_services(hass)
     
     return unload_ok
 
-class ConnectMeshAPI:
-    """API client for Connect Mesh."""
-
-    def __init__(self, session: aiohttp.ClientSession, api_token: str):
-        """Initialize the API client."""
-        self.session = session
-        self.api_token = api_token
-        self.base_url = "https://cloud.connect-mesh.io/api/core"
-
-    async def get_device_status(self, unique_id: str):
-        """Get the status of a device."""
-        headers = {
-            "accept": "*/*",
-            "Authorization": f"Bearer {self.api_token}"
-        }
-        async with self.session.get(f"{self.base_url}/devices/{unique_id}/status", headers=headers) as response:
-            if response.status == 200:
-                return await response.json()
-            else:
-                _LOGGER.error(f"Failed to get device status. Status code: {response.status}")
-                return None
-
-    async def set_power(self, unique_id: str, power: bool):
-        """Set the power state of a device."""
-        headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "power": "on" if power else "off",
-            "uniqueId": unique_id,
-            "acknowledged": True,
-            "retries": 0,
-            "timeout_ms": 10000
-        }
-        async with self.session.put(f"{self.base_url}/devices/power", headers=headers, json=data) as response:
-            if response.status != 200:
-                _LOGGER.error(f"Failed to set power state. Status code: {response.status}")
-
-    async def set_lightness(self, unique_id: str, lightness: float):
-        """Set the lightness of a device."""
-        headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "lightness": lightness,
-            "uniqueId": unique_id,
-            "acknowledged": True,
-            "retries": 0,
-            "timeout_ms": 10000
-        }
-        async with self.session.put(f"{self.base_url}/devices/lightness", headers=headers, json=data) as response:
-            if response.status != 200:
-                _LOGGER.error(f"Failed to set lightness. Status code: {response.status}")
-            else:
-                _LOGGER.debug(f"Set lightness to {lightness} for device {unique_id}")
-
-    async def set_temperature(self, unique_id: str, temperature: int):
-        """Set the color temperature of a device."""
-        headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "temperature": temperature,
-            "uniqueId": unique_id,
-            "acknowledged": True,
-            "retries": 0,
-            "timeout_ms": 10000
-        }
-        async with self.session.put(f"{self.base_url}/devices/temperature", headers=headers, json=data) as response:
-            if response.status != 200:
-                _LOGGER.error(f"Failed to set temperature. Status code: {response.status}")
-            else:
-                _LOGGER.debug(f"Set temperature to {temperature}K for device {unique_id}")
-
-
-    async def set_hue_saturation(self, unique_id: str, hue: float, saturation: float):
-        """Set the hue and saturation of a device."""
-        headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "hue": min(360, max(0, hue)),  # Ensure hue is between 0 and 360
-            "saturation": min(1, max(0, saturation)),  # Ensure saturation is between 0 and 1
-            "uniqueId": unique_id,
-            "acknowledged": True,
-            "retries": 0,
-            "timeout_ms": 10000
-        }
-        async with self.session.put(f"{self.base_url}/devices/hue_saturation", headers=headers, json=data) as response:
-            if response.status != 200:
-                _LOGGER.error(f"Failed to set hue and saturation. Status code: {response.status}")
-            else:
-                _LOGGER.debug(f"Set hue to {hue} and saturation to {saturation} for device {unique_id}")
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the status snapshots of the networks no other entry uses."""
+    in_use = {
+        network_id
+        for other in hass.config_entries.async_entries(DOMAIN)
+        if other.entry_id != entry.entry_id
+        for network_id in other.data.get("network_ids", [])
+    }
+    for network_id in set(entry.data.get("network_ids", [])) - in_use:
+        await Store(hass, SNAPSHOT_STORAGE_VERSION, snapshot_storage_key(network_id)).async_remove()
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload a config entry after its options or data changed.
+
+    Device list changes the entry applied itself do not need a reload.
+    """
+    running = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if running is not None and running["data"] == entry.data and running["options"] == entry.options:
+        return
+    await hass.config_entries.async_reload(entry.entry_id)
@@ -0,0 +1,603 @@
+"""API client for the Häfele Connect Mesh cloud."""
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import logging
+import time
+from collections import Counter, defaultdict
+from collections.abc import Awaitable, Callable, Collection
+from dataclasses import dataclass
+from typing import Any
+
+import aiohttp
+from homeassistant.util.json import json_loads
+
+from .const import (
+    API_BASE_URL,
+    ATTR_HUE_SATURATION,
+    ATTR_LIGHTNESS,
+    ATTR_POWER,
+    ATTR_TEMPERATURE,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_MAX_RESET_TIMEOUT,
+    CIRCUIT_RESET_TIMEOUT,
+    CONNECTION_LIMIT_PER_HOST,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_RATE_BURST,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_STATUS_TIMEOUT,
+    HEDGE_BUDGET,
+    HEDGE_BURST,
+    HEDGE_MIN_DELAY,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_QUANTILE,
+    HEDGE_WINDOW,
+    MAX_RETRIES,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_CAP,
+    WARM_UP_CONNECTIONS,
+)
+from .metrics import LatencyHistogram, LatencyWindow, endpoint_name
+from .models import API_LEVEL_MAX, DeviceState
+from .resilience import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_NAMES,
+    STATE_HALF_OPEN,
+    CircuitBreaker,
+    RequestScheduler,
+    TokenBucket,
+    backoff_delay,
+    parse_retry_after,
+)
+from .trace import TrafficRecorder
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ConnectMeshError(Exception):
+    """Base error of the Connect Mesh API client."""
+
+
+class CircuitOpenError(ConnectMeshError):
+    """Raised when a request is rejected because the circuit breaker is open."""
+
+
+@dataclass(slots=True)
+class CachedResponse:
+    """The last body of a revalidated GET and what identifies it."""
+
+    data: Any
+    digest: str
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+class ConnectMeshAPI:
+    """API client for Connect Mesh.
+
+    Every request goes through a request scheduler that serves commands
+    before verification reads and both before background polling, within
+    the account's rate limit. Rate limited (429) and server error (5xx)
+    responses, timeouts and connection errors are retried with jittered
+    backoff, and a circuit breaker stops calling the cloud after repeated
+    failures. ``counters`` counts each outcome, ``latencies`` holds a
+    latency histogram per endpoint and ``queue_waits`` one per priority.
+    ``recent_latencies`` keeps the latest latencies of each endpoint, of
+    successful or cancelled attempts, from which hedged status reads take
+    their deadline.
+
+    The network and device lists are revalidated with ETag and
+    If-Modified-Since when the cloud provides them, and recognised by a
+    hash of the body otherwise. An unchanged list is returned as the same
+    object as the previous call, without decoding it again.
+
+    While ``recorder`` is set, every attempt is also recorded to it.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        api_token: str,
+        base_url: str | None = None,
+        scheduler: RequestScheduler | None = None,
+    ):
+        """Initialize the API client.
+
+        Clients for the same account should share ``scheduler``.
+        """
+        self.session = session
+        self.api_token = api_token
+        self.base_url = base_url or API_BASE_URL
+        self.scheduler = scheduler or RequestScheduler(
+            TokenBucket(DEFAULT_RATE_LIMIT, DEFAULT_RATE_BURST), CONNECTION_LIMIT_PER_HOST
+        )
+        self.circuit_breaker = CircuitBreaker(
+            CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, CIRCUIT_MAX_RESET_TIMEOUT
+        )
+        self.counters: Counter[str] = Counter()
+        self.latencies: defaultdict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.queue_waits: defaultdict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.recent_latencies: defaultdict[str, LatencyWindow] = defaultdict(
+            functools.partial(LatencyWindow, HEDGE_WINDOW)
+        )
+        self._hedge_allowance = float(HEDGE_BURST)
+        self._responses: dict[str, CachedResponse] = {}
+        self.recorder: TrafficRecorder | None = None
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        priority: int = PRIORITY_INTERACTIVE,
+        time_budget: float | None = None,
+        revalidate: bool = False,
+        sent: asyncio.Event | None = None,
+        **kwargs: Any,
+    ) -> tuple[int, Any]:
+        """Send a request and return its status code and decoded JSON body.
+
+        The body is only decoded for successful GET requests. With
+        ``revalidate``, the body is cached and a GET that finds it unchanged
+        returns the cached body with status 200. Transient
+        failures are retried, honouring Retry-After; when every attempt failed
+        the last status code is returned, or the last exception raised.
+        ``time_budget`` bounds the call, retries included, but not the time
+        spent waiting for the scheduler, so low priority requests do not time
+        out behind commands. Raises CircuitOpenError while the circuit
+        breaker is open. ``sent`` is set when an attempt leaves the scheduler
+        queue.
+        """
+        async with asyncio.timeout(None) as deadline:
+            expires_at = None if time_budget is None else asyncio.get_running_loop().time() + time_budget
+            return await self._async_send(method, path, priority, deadline, expires_at, revalidate, sent, **kwargs)
+
+    async def _async_send(
+        self,
+        method: str,
+        path: str,
+        priority: int,
+        deadline: asyncio.Timeout,
+        expires_at: float | None,
+        revalidate: bool,
+        sent: asyncio.Event | None,
+        **kwargs: Any,
+    ) -> tuple[int, Any]:
+        """Send the attempts of a request for _request."""
+        kwargs.setdefault("timeout", aiohttp.ClientTimeout(total=DEFAULT_REQUEST_TIMEOUT))
+        cached = self._responses.get(path) if revalidate else None
+        if cached is not None:
+            kwargs["headers"] = {**kwargs.get("headers", {})}
+            if cached.etag is not None:
+                kwargs["headers"]["If-None-Match"] = cached.etag
+            if cached.last_modified is not None:
+                kwargs["headers"]["If-Modified-Since"] = cached.last_modified
+        status = 0
+        error: Exception | None = None
+        endpoint = endpoint_name(method, path)
+        latency = self.latencies[endpoint]
+        queue_wait = self.queue_waits[PRIORITY_NAMES[priority]]
+        for attempt in range(MAX_RETRIES + 1):
+            if not self.circuit_breaker.allow_request():
+                self.counters["circuit_rejected"] += 1
+                raise CircuitOpenError(
+                    f"Connect Mesh cloud unavailable, retrying in {self.circuit_breaker.retry_in:.0f}s"
+                )
+            # Only the probe of a half-open circuit gets this far
+            probe = self.circuit_breaker.state == STATE_HALF_OPEN
+            deadline.reschedule(None)
+            try:
+                waited = await self.scheduler.acquire(priority)
+            except asyncio.CancelledError:
+                if probe:
+                    self.circuit_breaker.release_probe()
+                raise
+            queue_wait.observe(waited)
+            if expires_at is not None:
+                expires_at += waited
+                deadline.reschedule(expires_at)
+            if sent is not None:
+                sent.set()
+            self.counters["requests"] += 1
+            retry_after = None
+            status, error, data, cancelled = 0, None, None, False
+            started = time.monotonic()
+            try:
+                async with self.session.request(method, f"{self.base_url}{path}", **kwargs) as response:
+                    status = response.status
+                    if status == 429 or status >= 500:
+                        self.counters["rate_limited" if status == 429 else "server_errors"] += 1
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    elif status == 304 and cached is not None:
+                        self.counters["not_modified"] += 1
+                        self.circuit_breaker.record_success()
+                        return 200, cached.data
+                    else:
+                        if status == 200 and method == "GET" and revalidate:
+                            data = self._decode_revalidated(path, await response.read(), response.headers)
+                        elif status == 200 and method == "GET":
+                            data = await response.json(loads=json_loads)
+                        self.circuit_breaker.record_success()
+                        if status != 200:
+                            self.counters["http_errors"] += 1
+                        return status, data
+            except TimeoutError as err:
+                self.counters["timeouts"] += 1
+                error = err
+            except aiohttp.ClientError as err:
+                self.counters["connection_errors"] += 1
+                error = err
+            except asyncio.CancelledError:
+                cancelled = True
+                if probe and deadline.expired():
+                    # The probe ran out of its time budget: the cloud is still failing
+                    if self.circuit_breaker.record_failure():
+                        self.counters["circuit_opened"] += 1
+                elif probe:
+                    # Nobody waits for the answer anymore, e.g. a hedged read that lost
+                    self.circuit_breaker.release_probe()
+                raise
+            finally:
+                self.scheduler.release()
+                elapsed = time.monotonic() - started
+                latency.observe(elapsed)
+                if (status == 200 and error is None) or cancelled:
+                    # A cancelled attempt, such as the slow loser of a hedged read,
+                    # took at least this long: keep it so the percentiles stay honest
+                    self.recent_latencies[endpoint].observe(elapsed)
+                if self.recorder is not None:
+                    self._record_attempt(
+                        method, path, priority, attempt, started, elapsed, status, kwargs.get("json"), data, error
+                    )
+
+            if self.circuit_breaker.record_failure():
+                self.counters["circuit_opened"] += 1
+                _LOGGER.warning(
+                    "Connect Mesh cloud keeps failing, pausing requests for %.0fs",
+                    self.circuit_breaker.reset_timeout,
+                )
+                break
+            if attempt == MAX_RETRIES:
+                break
+            self.counters["retries"] += 1
+            delay = backoff_delay(attempt, RETRY_BACKOFF_BASE, RETRY_BACKOFF_CAP)
+            if retry_after is not None:
+                delay = min(retry_after, RETRY_BACKOFF_CAP)
+            _LOGGER.debug("Retrying %s %s in %.1fs", method, path, delay)
+            await asyncio.sleep(delay)
+
+        self.counters["failures"] += 1
+        if error is not None:
+            raise error
+        return status, None
+
+    async def _async_hedged(
+        self, endpoint: str, send: Callable[..., Awaitable[tuple[int, Any]]]
+    ) -> tuple[int, Any]:
+        """Send a request, and a duplicate if it is slow, and return the first success.
+
+        The duplicate is sent once the request has been in flight longer than
+        HEDGE_QUANTILE of the recent latencies of its endpoint. Each hedged
+        request earns HEDGE_BUDGET of a duplicate, so hedging adds at most
+        that share of requests. Without a success, the result of the
+        original request is returned.
+        """
+        self._hedge_allowance = min(HEDGE_BURST, self._hedge_allowance + HEDGE_BUDGET)
+        window = self.recent_latencies[endpoint]
+        if len(window.samples) < HEDGE_MIN_SAMPLES or self._hedge_allowance < 1:
+            return await send()
+        delay = max(HEDGE_MIN_DELAY, window.percentile(HEDGE_QUANTILE))
+        sent = asyncio.Event()
+        tasks = [asyncio.ensure_future(send(sent=sent))]
+        try:
+            # The deadline runs from when the request left the scheduler queue
+            sent_wait = asyncio.ensure_future(sent.wait())
+            try:
+                await asyncio.wait((tasks[0], sent_wait), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                sent_wait.cancel()
+            if not tasks[0].done():
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self._hedge_allowance >= 1:
+                    self._hedge_allowance -= 1
+                    self.counters["hedged"] += 1
+                    tasks.append(asyncio.ensure_future(send()))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None and task.result()[0] == 200]
+                if winners:
+                    if winners[0] is not tasks[0]:
+                        self.counters["hedge_wins"] += 1
+                    return winners[0].result()
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _record_attempt(
+        self,
+        method: str,
+        path: str,
+        priority: int,
+        attempt: int,
+        started: float,
+        elapsed: float,
+        status: int,
+        request: Any,
+        response: Any,
+        error: Exception | None,
+    ) -> None:
+        """Record one attempt of a request to the recorder."""
+        if error is not None:
+            failure = type(error).__name__
+        elif not status:
+            # Neither answered nor failed: cancelled, e.g. by its time budget
+            failure = "CancelledError"
+        else:
+            failure = None
+        self.recorder.record(
+            method, path, PRIORITY_NAMES[priority], attempt, started, elapsed, status, request, response, failure
+        )
+
+    def _decode_revalidated(self, path: str, body: bytes, headers: Any) -> Any:
+        """Decode a revalidated body, reusing the cached one if it is identical."""
+        digest = hashlib.sha256(body).hexdigest()
+        cached = self._responses.get(path)
+        if cached is not None and cached.digest == digest:
+            self.counters["unchanged"] += 1
+            data = cached.data
+        else:
+            data = json_loads(body)
+        self._responses[path] = CachedResponse(
+            data, digest, headers.get("ETag"), headers.get("Last-Modified")
+        )
+        return data
+
+    async def async_warm_up(self, connections: int = WARM_UP_CONNECTIONS) -> None:
+        """Open pooled connections to the cloud before they are needed.
+
+        Resolves DNS and completes the TLS handshakes so the first poll or
+        command reuses a live connection. Failures are only logged.
+        """
+        headers = {
+            "accept": "*/*",
+            "Authorization": f"Bearer {self.api_token}"
+        }
+        results = await asyncio.gather(
+            *(
+                self._request("GET", "/networks", priority=PRIORITY_BACKGROUND, headers=headers)
+                for _ in range(connections)
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                _LOGGER.debug("Connection warm-up failed: %s", result)
+
+    async def get_networks(self, priority: int = PRIORITY_INTERACTIVE) -> list[dict] | None:
+        """Get the networks of the account."""
+        headers = {
+            "accept": "*/*",
+            "Authorization": f"Bearer {self.api_token}"
+        }
+        status, data = await self._request("GET", "/networks", priority, revalidate=True, headers=headers)
+        if status == 200:
+            return data
+        _LOGGER.error(f"Failed to fetch networks. Status code: {status}")
+        return None
+
+    async def get_devices(self, priority: int = PRIORITY_INTERACTIVE) -> list[dict] | None:
+        """Get the devices of the account."""
+        headers = {
+            "accept": "application/json",
+            "Authorization": f"Bearer {self.api_token}"
+        }
+        status, data = await self._request("GET", "/devices", priority, revalidate=True, headers=headers)
+        if status == 200:
+            return data
+        _LOGGER.error(f"Failed to fetch devices. Status code: {status}")
+        return None
+
+    async def get_device_status(
+        self,
+        unique_id: str,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: float | None = None,
+        hedge: bool = False,
+    ) -> DeviceState | None:
+        """Get the decoded status of a device.
+
+        ``timeout`` does not count the time spent queued behind more urgent
+        requests. With ``hedge``, a read slower than most recent ones is sent
+        again and the first answer wins.
+        """
+        headers = {
+            "accept": "*/*",
+            "Authorization": f"Bearer {self.api_token}"
+        }
+        path = f"/devices/{unique_id}/status"
+        send = functools.partial(
+            self._request,
+            "GET",
+            path,
+            priority=priority,
+            time_budget=timeout,
+            headers=headers,
+        )
+        if hedge:
+            status, data = await self._async_hedged(endpoint_name("GET", path), send)
+        else:
+            status, data = await send()
+        if status == 200:
+            return DeviceState.from_status(data)
+        else:
+            _LOGGER.error(f"Failed to get device status. Status code: {status}")
+            return None
+
+    async def get_device_statuses(
+        self,
+        unique_ids: list[str],
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout: float = DEFAULT_STATUS_TIMEOUT,
+        priority: int = PRIORITY_BACKGROUND,
+        hedge: bool = False,
+    ) -> dict[str, DeviceState | None]:
+        """Get the status of several devices concurrently.
+
+        At most ``max_concurrency`` requests are in flight at once and each one
+        is bounded by ``timeout`` seconds once sent. A device that fails or
+        times out maps to ``None`` so only its own entity becomes unavailable.
+        The reads are background traffic unless ``priority`` says otherwise,
+        and slow ones are hedged with ``hedge``.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch(unique_id: str) -> DeviceState | None:
+            async with semaphore:
+                try:
+                    return await self.get_device_status(
+                        unique_id, priority=priority, timeout=timeout, hedge=hedge
+                    )
+                except TimeoutError:
+                    _LOGGER.warning("Timed out getting status of device %s", unique_id)
+                except (aiohttp.ClientError, ConnectMeshError) as e:
+                    _LOGGER.warning("Error getting status of device %s: %s", unique_id, e)
+                return None
+
+        results = await asyncio.gather(*(fetch(unique_id) for unique_id in unique_ids))
+        return dict(zip(unique_ids, results))
+
+    async def set_power(self, unique_id: str, power: bool, acknowledged: bool = True) -> bool:
+        """Set the power state of a device."""
+        headers = {
+            "accept": "application/json",
+            "Authorization": f"Bearer {self.api_token}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "power": "on" if power else "off",
+            "uniqueId": unique_id,
+            "acknowledged": acknowledged,
+            "retries": 0,
+            "timeout_ms": 10000
+        }
+        status, _ = await self._request("PUT", "/devices/power", headers=headers, json=data)
+        if status != 200:
+            _LOGGER.error(f"Failed to set power state. Status code: {status}")
+        return status == 200
+
+    async def set_lightness(self, unique_id: str, lightness: float, acknowledged: bool = True) -> bool:
+        """Set the lightness of a device."""
+        headers = {
+            "accept": "application/json",
+            "Authorization": f"Bearer {self.api_token}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "lightness": lightness,
+            "uniqueId": unique_id,
+            "acknowledged": acknowledged,
+            "retries": 0,
+            "timeout_ms": 10000
+        }
+        status, _ = await self._request("PUT", "/devices/lightness", headers=headers, json=data)
+        if status != 200:
+            _LOGGER.error(f"Failed to set lightness. Status code: {status}")
+        else:
+            _LOGGER.debug(f"Set lightness to {lightness} for device {unique_id}")
+        return status == 200
+
+    async def set_temperature(self, unique_id: str, temperature: int, acknowledged: bool = True) -> bool:
+        """Set the color temperature of a device."""
+        headers = {
+            "accept": "application/json",
+            "Authorization": f"Bearer {self.api_token}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "temperature": temperature,
+            "uniqueId": unique_id,
+            "acknowledged": acknowledged,
+            "retries": 0,
+            "timeout_ms": 10000
+        }
+        status, _ = await self._request("PUT", "/devices/temperature", headers=headers, json=data)
+        if status != 200:
+            _LOGGER.error(f"Failed to set temperature. Status code: {status}")
+        else:
+            _LOGGER.debug(f"Set temperature to {temperature}K for device {unique_id}")
+        return status == 200
+
+
+    async def set_hue_saturation(
+        self, unique_id: str, hue: float, saturation: float, acknowledged: bool = True
+    ) -> bool:
+        """Set the hue and saturation of a device."""
+        headers = {
+            "accept": "application/json",
+            "Authorization": f"Bearer {self.api_token}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "hue": min(API_LEVEL_MAX, max(0, hue)),  # Hue is on the same 0-65535 scale as statuses
+            "saturation": min(1, max(0, saturation)),  # Ensure saturation is between 0 and 1
+            "uniqueId": unique_id,
+            "acknowledged": acknowledged,
+            "retries": 0,
+            "timeout_ms": 10000
+        }
+        status, _ = await self._request("PUT", "/devices/hue_saturation", headers=headers, json=data)
+        if status != 200:
+            _LOGGER.error(f"Failed to set hue and saturation. Status code: {status}")
+        else:
+            _LOGGER.debug(f"Set hue to {hue} and saturation to {saturation} for device {unique_id}")
+        return status == 200
+
+    async def send_command(self, unique_id: str, command: dict[str, Any], acknowledged: bool = True) -> bool:
+        """Send a command made of power/lightness/temperature/hue_saturation.
+
+        A lightness also turns the device on, so power is only sent on its
+        own. Acknowledged requests return once the device confirmed them over
+        the mesh; unacknowledged ones as soon as the cloud queued them.
+        Returns True if every request was accepted.
+        """
+        ok = True
+        if ATTR_LIGHTNESS in command:
+            ok &= await self.set_lightness(unique_id, command[ATTR_LIGHTNESS], acknowledged)
+        elif ATTR_POWER in command:
+            ok &= await self.set_power(unique_id, command[ATTR_POWER], acknowledged)
+        if ATTR_TEMPERATURE in command:
+            ok &= await self.set_temperature(unique_id, command[ATTR_TEMPERATURE], acknowledged)
+        if ATTR_HUE_SATURATION in command:
+            ok &= await self.set_hue_saturation(unique_id, *command[ATTR_HUE_SATURATION], acknowledged)
+        return ok
+
+    async def set_many(
+        self,
+        commands: dict[str, dict[str, Any]],
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        unacknowledged: Collection[str] = (),
+    ) -> dict[str, bool]:
+        """Send a command to each of several devices concurrently.
+
+        ``commands`` maps device unique IDs to the command for that device. At
+        most ``max_concurrency`` devices are commanded at once, and those in
+        ``unacknowledged`` are sent without waiting for the mesh. Returns
+        whether each device accepted its command.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def send(unique_id: str, command: dict[str, Any]) -> bool:
+            async with semaphore:
+                try:
+                    return await self.send_command(unique_id, command, unique_id not in unacknowledged)
+                except (TimeoutError, aiohttp.ClientError, ConnectMeshError) as e:
+                    _LOGGER.warning("Error sending command to device %s: %s", unique_id, e)
+                    return False
+
+        results = await asyncio.gather(*(send(unique_id, command) for unique_id, command in commands.items()))
+        return dict(zip(commands, results))
@@ -0,0 +1,199 @@
+"""Per-device command pipeline for Häfele Connect Mesh."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+from .api import ConnectMeshAPI
+from .const import ATTR_HUE_SATURATION, ATTR_LIGHTNESS, ATTR_POWER, ATTR_TEMPERATURE
+from .models import API_LEVEL_MAX, DeviceState
+
+_LOGGER = logging.getLogger(__name__)
+
+# How far a reported value may be from the commanded one and still match
+STATE_TOLERANCES = {
+    "lightness": 655,
+    "temperature": 50,
+    "hue": 364,
+    "saturation": 655,
+}
+# How far a cached value may be from a restored one for the device to be left
+# alone: half a Home Assistant brightness step, the rest must be equal
+TRIM_TOLERANCES = {
+    "lightness": 128,
+}
+
+
+def merge_command(pending: dict[str, Any], command: dict[str, Any]) -> dict[str, Any]:
+    """Merge a newer command into the attributes that are not sent yet.
+
+    Newer values replace older ones. Turning the device off supersedes
+    everything queued before it, and a lightness implies the device is on.
+    """
+    if command.get(ATTR_POWER) is False:
+        return {ATTR_POWER: False}
+    merged = {**pending, **command}
+    if ATTR_LIGHTNESS in merged:
+        merged.pop(ATTR_POWER, None)
+    return merged
+
+
+def expected_state(command: dict[str, Any]) -> dict[str, Any]:
+    """Return the DeviceState fields a device reports once a command is applied."""
+    if command.get(ATTR_POWER) is False:
+        return {"power": False}
+    state: dict[str, Any] = {"power": True}
+    if ATTR_LIGHTNESS in command:
+        state["lightness"] = round(command[ATTR_LIGHTNESS] * 65535)
+    if ATTR_TEMPERATURE in command:
+        state["temperature"] = command[ATTR_TEMPERATURE]
+    if ATTR_HUE_SATURATION in command:
+        hue, saturation = command[ATTR_HUE_SATURATION]
+        state["hue"] = round(hue)
+        state["saturation"] = round(saturation * 65535)
+    return state
+
+
+def state_matches(
+    state: DeviceState | None, expected: dict[str, Any], tolerances: dict[str, int] = STATE_TOLERANCES
+) -> bool:
+    """Return whether a device state shows the expected values, within tolerances."""
+    if state is None:
+        return False
+    for key, value in expected.items():
+        actual = getattr(state, key)
+        if actual is None or abs(actual - value) > tolerances.get(key, 0):
+            return False
+    return True
+
+
+def command_for_state(state: DeviceState) -> dict[str, Any]:
+    """Return the command that brings a device to a state."""
+    if not state.power:
+        return {ATTR_POWER: False}
+    command: dict[str, Any] = {}
+    if state.lightness is not None:
+        command[ATTR_LIGHTNESS] = state.lightness / API_LEVEL_MAX
+    else:
+        command[ATTR_POWER] = True
+    if state.temperature is not None:
+        command[ATTR_TEMPERATURE] = state.temperature
+    elif state.hue is not None and state.saturation is not None:
+        command[ATTR_HUE_SATURATION] = (state.hue, state.saturation / API_LEVEL_MAX)
+    return command
+
+
+def minimal_command(state: DeviceState | None, command: dict[str, Any]) -> dict[str, Any]:
+    """Return the part of a command a device in ``state`` does not show yet.
+
+    Returns an empty command when the device is already in the commanded
+    state. Without a known state the whole command is needed.
+    """
+    if state is None:
+        return dict(command)
+    if command.get(ATTR_POWER) is False:
+        return dict(command) if state.power else {}
+    needed = {
+        key: value
+        for key, value in command.items()
+        if key != ATTR_POWER
+        and not state_matches(
+            state,
+            {k: v for k, v in expected_state({key: value}).items() if k != "power"},
+            TRIM_TOLERANCES,
+        )
+    }
+    if not state.power and ATTR_LIGHTNESS not in needed:
+        # The device must be turned on, at the commanded lightness if any
+        if ATTR_LIGHTNESS in command:
+            needed[ATTR_LIGHTNESS] = command[ATTR_LIGHTNESS]
+        else:
+            needed[ATTR_POWER] = True
+    return needed
+
+
+@dataclass(slots=True)
+class PendingCommand:
+    """A command whose effect has not been confirmed by a status read yet."""
+
+    command: dict[str, Any]
+    expected: dict[str, Any]
+    generation: int
+    deadline: float
+    resends: int = 0
+    # The status read that triggered the last resend
+    resent_after: DeviceState | None = None
+
+
+class CommandQueue:
+    """Coalesce the commands sent to one device.
+
+    Commands arriving within ``window`` seconds, or while a previous batch is
+    still being sent, are merged and only the final state is sent. Batches
+    are sent unacknowledged when ``acknowledged`` is False.
+    """
+
+    def __init__(self, hass: HomeAssistant, api_client: ConnectMeshAPI, unique_id: str, window: float):
+        """Initialize the queue."""
+        self.hass = hass
+        self.api_client = api_client
+        self.unique_id = unique_id
+        self.window = window
+        self.acknowledged = True
+        self._pending: dict[str, Any] = {}
+        self._waiters: list[asyncio.Future[bool]] = []
+        self._task: asyncio.Task | None = None
+
+    @property
+    def depth(self) -> int:
+        """Return the number of callers waiting for their command to be sent."""
+        return len(self._waiters)
+
+    async def async_send(self, **command: Any) -> bool:
+        """Queue attributes for the device and wait until they are sent.
+
+        Returns whether the cloud accepted the batch the command was sent in.
+        """
+        self._pending = merge_command(self._pending, command)
+        waiter: asyncio.Future[bool] = self.hass.loop.create_future()
+        self._waiters.append(waiter)
+        if self._task is None or self._task.done():
+            self._task = self.hass.async_create_task(
+                self._async_flush(), f"hafele_connect_mesh command queue {self.unique_id}"
+            )
+        return await waiter
+
+    def cancel(self) -> None:
+        """Cancel the queue and fail the callers still waiting."""
+        if self._task is not None:
+            self._task.cancel()
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.cancel()
+        self._pending, self._waiters = {}, []
+
+    async def _async_flush(self) -> None:
+        """Send the merged commands until nothing is pending."""
+        while self._pending:
+            await asyncio.sleep(self.window)
+            command, self._pending = self._pending, {}
+            waiters, self._waiters = self._waiters, []
+            try:
+                accepted = await self._async_dispatch(command)
+            except Exception as err:  # pylint: disable=broad-except
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(err)
+            else:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(accepted)
+
+    async def _async_dispatch(self, command: dict[str, Any]) -> bool:
+        """Send one merged command to the device."""
+        _LOGGER.debug("Sending %s to device %s", command, self.unique_id)
+        return await self.api_client.send_command(self.unique_id, command, self.acknowledged)
@@ -1,15 +1,37 @@
 """Config flow for Häfele Connect Mesh integration."""
 from __future__ import annotations
 
+import asyncio
 import logging
 import voluptuous as vol
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.components import webhook
+from homeassistant.const import CONF_WEBHOOK_ID, MAJOR_VERSION, MINOR_VERSION
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.network import NoURLAvailableError
 import aiohttp
 
-from .const import DOMAIN
+from .api import ConnectMeshAPI, ConnectMeshError
+from .const import (
+    CONF_COMMAND_MODE_OVERRIDES,
+    CONF_FAST_COMMANDS,
+    CONF_MAX_CONCURRENCY,
+    CONF_MAX_POLL_INTERVAL,
+    CONF_MAX_POLL_RATE,
+    CONF_MIN_POLL_INTERVAL,
+    CONF_STATUS_TIMEOUT,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MAX_POLL_RATE,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_STATUS_TIMEOUT,
+    DEVICE_TYPE_SWITCH,
+    DOMAIN,
+)
+from .coordinator import async_get_registry
+from .discovery import async_classify_devices, devices_to_classify
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,14 +44,22 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for Häfele Connect Mesh."""
 
-    VERSION = 2
+    VERSION = 3
     
     def __init__(self):
         """Initialize the config flow."""
         self.api_token = None
         self.networks = None
-        self.selected_network_id = None
+        self.selected_network_ids: list[str] = []
         self.devices = None
+        self.processed_devices: dict[str, dict] = {}
+        self._discovery_task: asyncio.Task | None = None
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> OptionsFlowHandler:
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler(config_entry)
 
     async def async_step_user(self, user_input=None) -> FlowResult:
         """Handle the initial step."""
@@ -74,8 +104,10 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Handle network selection."""
         errors = {}
         if user_input is not None:
-            self.selected_network_id = user_input["network"]
-            return await self.async_step_process_devices()
+            if user_input["networks"]:
+                self.selected_network_ids = user_input["networks"]
+                return await self.async_step_process_devices()
+            errors["base"] = "no_network_selected"
 
         if self.networks is None:
             self.networks = await self._fetch_networks()
@@ -84,7 +116,9 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             return self.async_abort(reason="no_networks")
 
         network_schema = vol.Schema({
-            vol.Required("network"): vol.In({net["id"]: net["name"] for net in self.networks})
+            vol.Required("networks", default=[net["id"] for net in self.networks]): cv.multi_select(
+                {net["id"]: net["name"] for net in self.networks}
+            )
         })
 
         # Create a bulleted list of networks
@@ -97,103 +131,275 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             data_schema=network_schema,
             errors=errors,
             description_placeholders={
-                "select_info": "Please select one network to add to Home Assistant.",
+                "select_info": "Please select the networks to add to Home Assistant.",
                 "networks": networks_info,
             },
         )
 
     async def async_step_process_devices(self, user_input=None) -> FlowResult:
-        """Process devices for the selected network."""
+        """Classify the devices of the selected networks, showing progress."""
         if self.devices is None:
-            self.devices = await self._fetch_devices()
-            self.devices = [device for device in self.devices if device["networkId"] == self.selected_network_id]
-
-        processed_devices = []
-        for device in self.devices:
-            status = await self._fetch_device_status(device["uniqueId"])
-            device_type = self._determine_device_type(status)
-            processed_devices.append({
-                "uniqueId": device["uniqueId"],
-                "name": device["name"],
-                "type": device_type
-            })
-
-        # Create the config entry
+            devices = await self._fetch_devices()
+            if devices is None:
+                return self.async_abort(reason="cannot_connect")
+            self.devices = [device for device in devices if device["networkId"] in self.selected_network_ids]
+
+        if self._discovery_task is None:
+            # Only devices that are not classified yet, so a retry skips the others
+            pending = devices_to_classify(self.devices, list(self.processed_devices.values()))
+            self._discovery_task = self.hass.async_create_task(
+                async_classify_devices(self._api_client, pending),
+                "hafele_connect_mesh device discovery",
+            )
+        if not self._discovery_task.done():
+            return self.async_show_progress(
+                step_id="process_devices",
+                progress_action="discover_devices",
+                progress_task=self._discovery_task,
+                description_placeholders={"count": str(len(self.devices))},
+            )
+
+        task, self._discovery_task = self._discovery_task, None
+        try:
+            classified = task.result()
+        except (TimeoutError, aiohttp.ClientError, ConnectMeshError) as e:
+            _LOGGER.error(f"Error classifying devices: {e}")
+            return self.async_show_progress_done(next_step_id="discovery_failed")
+        self.processed_devices.update({device["uniqueId"]: device for device in classified})
+        if any(not device.get("classified", True) for device in self.processed_devices.values()):
+            return self.async_show_progress_done(next_step_id="discovery_failed")
+        return self.async_show_progress_done(next_step_id="finish")
+
+    async def async_step_discovery_failed(self, user_input=None) -> FlowResult:
+        """Offer to retry the devices whose status could not be read."""
+        failed = [
+            device["name"]
+            for device in self.processed_devices.values()
+            if not device.get("classified", True)
+        ]
+        return self.async_show_menu(
+            step_id="discovery_failed",
+            menu_options=["process_devices", "finish"],
+            description_placeholders={"devices": ", ".join(failed) or "-"},
+        )
+
+    async def async_step_finish(self, user_input=None) -> FlowResult:
+        """Create the config entry."""
         return self.async_create_entry(
             title="Häfele Connect Mesh",
             data={
                 "api_token": self.api_token,
-                "network_id": self.selected_network_id,
-                "devices": processed_devices
+                CONF_WEBHOOK_ID: webhook.async_generate_id(),
+                "network_ids": self.selected_network_ids,
+                "devices": [
+                    self.processed_devices.get(device["uniqueId"])
+                    or {"uniqueId": device["uniqueId"], "name": device["name"], "networkId": device["networkId"],
+                        "type": DEVICE_TYPE_SWITCH, "classified": False}
+                    for device in self.devices
+                ],
             }
         )
 
+    @property
+    def _api_client(self) -> ConnectMeshAPI:
+        """Return the API client for the token being configured."""
+        return async_get_registry(self.hass).async_get_api_client(self.api_token)
+
+    @callback
+    def async_remove(self) -> None:
+        """Stop discovery and release the API client, unless the entry created by the flow uses it."""
+        if self._discovery_task is not None:
+            self._discovery_task.cancel()
+        if self.api_token is not None:
+            async_get_registry(self.hass).async_release_api_client(self.api_token)
+
     async def _fetch_networks(self):
         """Fetch networks from the API."""
-        session = async_get_clientsession(self.hass)
-        headers = {
-            "accept": "*/*",
-            "Authorization": f"Bearer {self.api_token}"
-        }
         try:
-            async with session.get("https://cloud.connect-mesh.io/api/core/networks", headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    _LOGGER.error(f"Failed to fetch networks. Status code: {response.status}")
-                    return None
-        except aiohttp.ClientError as e:
+            return await self._api_client.get_networks()
+        except (TimeoutError, aiohttp.ClientError, ConnectMeshError) as e:
             _LOGGER.error(f"Error fetching networks: {e}")
             return None
 
     async def _fetch_devices(self):
         """Fetch devices from the API."""
-        session = async_get_clientsession(self.hass)
-        headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {self.api_token}"
-        }
         try:
-            async with session.get("https://cloud.connect-mesh.io/api/core/devices", headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    _LOGGER.error(f"Failed to fetch devices. Status code: {response.status}")
-                    return None
-        except aiohttp.ClientError as e:
+            return await self._api_client.get_devices()
+        except (TimeoutError, aiohttp.ClientError, ConnectMeshError) as e:
             _LOGGER.error(f"Error fetching devices: {e}")
             return None
 
-    async def _fetch_device_status(self, unique_id):
-        """Fetch status for a specific device."""
-        session = async_get_clientsession(self.hass)
-        headers = {
-            "accept": "*/*",
-            "Authorization": f"Bearer {self.api_token}"
-        }
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle options and device rescans for Häfele Connect Mesh."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry):
+        """Initialize the options flow."""
+        if (MAJOR_VERSION, MINOR_VERSION) < (2024, 11):
+            # Home Assistant provides config_entry itself since 2024.11
+            self.config_entry = config_entry
+        self._rescan_network_ids: list[str] = []
+        self._rescan_task: asyncio.Task | None = None
+        self._rescan_devices: list[dict] | None = None
+
+    async def async_step_init(self, user_input=None) -> FlowResult:
+        """Choose between the polling options and a device rescan."""
+        webhook_id = self.config_entry.data.get(CONF_WEBHOOK_ID)
+        try:
+            webhook_url = webhook.async_generate_url(self.hass, webhook_id)
+        except NoURLAvailableError:
+            webhook_url = webhook.async_generate_path(webhook_id)
+        return self.async_show_menu(
+            step_id="init",
+            menu_options=["polling", "commands", "rescan"],
+            description_placeholders={"webhook_url": webhook_url},
+        )
+
+    async def async_step_polling(self, user_input=None) -> FlowResult:
+        """Manage the polling options."""
+        errors = {}
+        if user_input is not None:
+            if user_input[CONF_MIN_POLL_INTERVAL] > user_input[CONF_MAX_POLL_INTERVAL]:
+                errors["base"] = "invalid_poll_interval"
+            else:
+                return self.async_create_entry(title="", data={**self.config_entry.options, **user_input})
+
+        options = self.config_entry.options
+        options_schema = vol.Schema({
+            vol.Required(
+                CONF_MAX_CONCURRENCY,
+                default=options.get(CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY),
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=50)),
+            vol.Required(
+                CONF_STATUS_TIMEOUT,
+                default=options.get(CONF_STATUS_TIMEOUT, DEFAULT_STATUS_TIMEOUT),
+            ): vol.All(vol.Coerce(float), vol.Range(min=1, max=30)),
+            vol.Required(
+                CONF_MIN_POLL_INTERVAL,
+                default=options.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL),
+            ): vol.All(vol.Coerce(int), vol.Range(min=5, max=3600)),
+            vol.Required(
+                CONF_MAX_POLL_INTERVAL,
+                default=options.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL),
+            ): vol.All(vol.Coerce(int), vol.Range(min=5, max=3600)),
+            vol.Required(
+                CONF_MAX_POLL_RATE,
+                default=options.get(CONF_MAX_POLL_RATE, DEFAULT_MAX_POLL_RATE),
+            ): vol.All(vol.Coerce(float), vol.Range(min=0.1, max=50)),
+        })
+
+        return self.async_show_form(step_id="polling", data_schema=options_schema, errors=errors)
+
+    async def async_step_commands(self, user_input=None) -> FlowResult:
+        """Manage how commands are sent."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data={**self.config_entry.options, **user_input})
+
+        options = self.config_entry.options
+        devices = {device["uniqueId"]: device["name"] for device in self.config_entry.data["devices"]}
+        options_schema = vol.Schema({
+            vol.Required(
+                CONF_FAST_COMMANDS,
+                default=options.get(CONF_FAST_COMMANDS, False),
+            ): bool,
+            vol.Required(
+                CONF_COMMAND_MODE_OVERRIDES,
+                default=[
+                    unique_id for unique_id in options.get(CONF_COMMAND_MODE_OVERRIDES, []) if unique_id in devices
+                ],
+            ): cv.multi_select(devices),
+        })
+
+        return self.async_show_form(step_id="commands", data_schema=options_schema)
+
+    async def async_step_rescan(self, user_input=None) -> FlowResult:
+        """Choose the networks of the entry before rescanning them."""
+        errors = {}
+        if user_input is not None:
+            if user_input["networks"]:
+                self._rescan_network_ids = user_input["networks"]
+                return await self.async_step_rescan_devices()
+            errors["base"] = "no_network_selected"
+
+        api_client = async_get_registry(self.hass).async_get_api_client(self.config_entry.data["api_token"])
         try:
-            async with session.get(f"https://cloud.connect-mesh.io/api/core/devices/{unique_id}/status", headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    _LOGGER.error(f"Failed to fetch device status for {unique_id}. Status code: {response.status}")
-                    return None
-        except aiohttp.ClientError as e:
-            _LOGGER.error(f"Error fetching device status for {unique_id}: {e}")
+            networks = await api_client.get_networks()
+        except (TimeoutError, aiohttp.ClientError, ConnectMeshError) as e:
+            _LOGGER.error(f"Error fetching networks: {e}")
+            return self.async_abort(reason="cannot_connect")
+        if not networks:
+            return self.async_abort(reason="cannot_connect")
+
+        return self.async_show_form(
+            step_id="rescan",
+            data_schema=vol.Schema({
+                vol.Required("networks", default=self.config_entry.data["network_ids"]): cv.multi_select(
+                    {net["id"]: net["name"] for net in networks}
+                )
+            }),
+            errors=errors,
+        )
+
+    async def async_step_rescan_devices(self, user_input=None) -> FlowResult:
+        """Reclassify the devices that are new, renamed or not classified yet."""
+        if self._rescan_task is None:
+            self._rescan_task = self.hass.async_create_task(
+                self._async_rescan(), "hafele_connect_mesh device rescan"
+            )
+        if not self._rescan_task.done():
+            return self.async_show_progress(
+                step_id="rescan_devices",
+                progress_action="rescan_devices",
+                progress_task=self._rescan_task,
+            )
+
+        task, self._rescan_task = self._rescan_task, None
+        try:
+            self._rescan_devices = task.result()
+        except (TimeoutError, aiohttp.ClientError, ConnectMeshError) as e:
+            _LOGGER.error(f"Error rescanning devices: {e}")
+            self._rescan_devices = None
+        return self.async_show_progress_done(next_step_id="rescan_done")
+
+    async def async_step_rescan_done(self, user_input=None) -> FlowResult:
+        """Store the rescanned devices, which reloads the entry."""
+        if self._rescan_devices is None:
+            return self.async_abort(reason="cannot_connect")
+        self.hass.config_entries.async_update_entry(
+            self.config_entry,
+            data={
+                **self.config_entry.data,
+                "network_ids": self._rescan_network_ids,
+                "devices": self._rescan_devices,
+            },
+        )
+        return self.async_create_entry(title="", data=dict(self.config_entry.options))
+
+    async def _async_rescan(self) -> list[dict] | None:
+        """Return the devices of the chosen networks, classifying only what changed.
+
+        Devices that are no longer in these networks are dropped.
+        """
+        data = self.config_entry.data
+        api_client = async_get_registry(self.hass).async_get_api_client(data["api_token"])
+        devices = await api_client.get_devices()
+        if devices is None:
             return None
+        devices = [device for device in devices if device["networkId"] in self._rescan_network_ids]
+        known = {device["uniqueId"]: device for device in data.get("devices", [])}
+        options = self.config_entry.options
+        classified = await async_classify_devices(
+            api_client,
+            devices_to_classify(devices, list(known.values())),
+            max_concurrency=options.get(CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY),
+            timeout=options.get(CONF_STATUS_TIMEOUT, DEFAULT_STATUS_TIMEOUT),
+        )
+        known.update({device["uniqueId"]: device for device in classified})
+        return [known[device["uniqueId"]] for device in devices]
 
-    def _determine_device_type(self, status):
-        """Determine the device type based on its status."""
-        if status is None:
-            _LOGGER.warning("Device status is None, defaulting to 'switch' type")
-            return "switch"
-        
-        abstraction = status.get("abstraction")
-        if abstraction == "Multiwhite":
-            return "temperature"
-        elif abstraction == "RGB":
-            return "rgb"
-        elif abstraction == "Light":
-            return "brightness"
-        else:
-            return "switch"
+    @callback
+    def async_remove(self) -> None:
+        """Stop the rescan and release the API client, unless the running entry uses it."""
+        if self._rescan_task is not None:
+            self._rescan_task.cancel()
+        async_get_registry(self.hass).async_release_api_client(self.config_entry.data["api_token"])
@@ -1,3 +1,97 @@
 DOMAIN = "hafele_connect_mesh"
 MANUFACTURER = "Häfele Connect Mesh"
-PLATFORMS = ["light"]
+API_BASE_URL = "https://cloud.connect-mesh.io/api/core"
+
+PLATFORMS = ["light", "sensor", "switch"]
+
+DATA_REGISTRY = f"{DOMAIN}_registry"
+
+ATTR_POWER = "power"
+ATTR_LIGHTNESS = "lightness"
+ATTR_TEMPERATURE = "temperature"
+ATTR_HUE_SATURATION = "hue_saturation"
+
+DEVICE_TYPE_SWITCH = "switch"
+
+MIN_KELVIN = 2700
+MAX_KELVIN = 5000
+
+CONF_MAX_CONCURRENCY = "max_concurrency"
+CONF_STATUS_TIMEOUT = "status_timeout"
+CONF_MIN_POLL_INTERVAL = "min_poll_interval"
+CONF_MAX_POLL_INTERVAL = "max_poll_interval"
+CONF_MAX_POLL_RATE = "max_poll_rate"
+CONF_FAST_COMMANDS = "fast_commands"
+CONF_COMMAND_MODE_OVERRIDES = "command_mode_overrides"
+
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_STATUS_TIMEOUT = 8
+DEFAULT_MIN_POLL_INTERVAL = 10
+DEFAULT_MAX_POLL_INTERVAL = 120
+# Status reads per second for polling, shared by the networks of an account
+DEFAULT_MAX_POLL_RATE = 5
+# Share of the poll interval by which each poll may come early, and the
+# shortest time between two polling ticks
+POLL_JITTER = 0.2
+MIN_POLL_TICK = 1
+DEFAULT_COMMAND_WINDOW = 0.3
+PENDING_COMMAND_TIMEOUT = 15
+VERIFY_DELAYS_ACKNOWLEDGED = (0.5, 1.5, 4.0)
+# Unacknowledged commands are resent after a read that misses them, at most
+# MAX_COMMAND_RESENDS times and only while resending changes what is read
+VERIFY_DELAYS_UNACKNOWLEDGED = (0.5, 1.0, 2.0, 4.0)
+MAX_COMMAND_RESENDS = 2
+VERIFY_DELAYS_REJECTED = (0.0,)
+DEFAULT_REQUEST_TIMEOUT = 15
+# A status read slower than this percentile of the recent ones is sent again,
+# for at most HEDGE_BUDGET extra reads per read and HEDGE_BURST in a row,
+# which a new client starts with
+HEDGE_QUANTILE = 0.95
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+HEDGE_BUDGET = 0.1
+HEDGE_BURST = 10
+# Cached statuses younger than this answer get_device_status without a read
+DEFAULT_STATUS_MAX_AGE = 30
+
+SNAPSHOT_STORAGE_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 60
+SCENE_STORAGE_VERSION = 1
+SCENE_SAVE_DELAY = 5
+
+# While events are pushed, devices are only polled to catch missed events.
+# An event source silent for longer is considered gone and polling resumes.
+EVENT_SWEEP_INTERVAL = 600
+EVENT_SILENCE_TIMEOUT = 300
+
+# The account's networks and devices are checked for changes this often
+DEVICE_RECONCILE_INTERVAL = 900
+SIGNAL_DEVICES_CHANGED = f"{DOMAIN}_devices_changed_{{}}"
+
+# Traffic recordings: how long they last by default and at most, and how
+# many requests they keep
+DEFAULT_TRACE_DURATION = 300
+MAX_TRACE_DURATION = 3600
+TRACE_MAX_ENTRIES = 200000
+TRACE_FORMAT_VERSION = 1
+
+DISCOVERY_RETRIES = 2
+DISCOVERY_RETRY_DELAY = 2
+
+CONNECTION_LIMIT = 50
+CONNECTION_LIMIT_PER_HOST = 20
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 75
+WARM_UP_CONNECTIONS = 2
+
+DEFAULT_RATE_LIMIT = 10
+DEFAULT_RATE_BURST = 20
+
+MAX_RETRIES = 2
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_CAP = 10
+
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30
+CIRCUIT_MAX_RESET_TIMEOUT = 300
@@ -0,0 +1,895 @@
+"""Shared status coordinator for Häfele Connect Mesh networks."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections.abc import Iterable
+from dataclasses import replace
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE, EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .api import ConnectMeshAPI, ConnectMeshError
+from .commands import (
+    CommandQueue,
+    PendingCommand,
+    command_for_state,
+    expected_state,
+    merge_command,
+    minimal_command,
+    state_matches,
+)
+from .const import (
+    CONNECTION_LIMIT_PER_HOST,
+    DATA_REGISTRY,
+    DEFAULT_COMMAND_WINDOW,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MAX_POLL_RATE,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_RATE_BURST,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_STATUS_MAX_AGE,
+    DEFAULT_STATUS_TIMEOUT,
+    DOMAIN,
+    EVENT_SILENCE_TIMEOUT,
+    EVENT_SWEEP_INTERVAL,
+    MAX_COMMAND_RESENDS,
+    MIN_POLL_TICK,
+    PENDING_COMMAND_TIMEOUT,
+    POLL_JITTER,
+    SNAPSHOT_SAVE_DELAY,
+    SNAPSHOT_STORAGE_VERSION,
+    VERIFY_DELAYS_ACKNOWLEDGED,
+    VERIFY_DELAYS_REJECTED,
+    VERIFY_DELAYS_UNACKNOWLEDGED,
+)
+from .metrics import LatencyHistogram
+from .models import DeviceState
+from .resilience import PRIORITY_VERIFY, RequestScheduler, TokenBucket
+from .scheduler import PollScheduler
+from .trace import TrafficRecorder
+from .transport import async_create_transport
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ConnectMeshCoordinator(DataUpdateCoordinator[dict[str, DeviceState | None]]):
+    """Poll the status of every device of one network.
+
+    Several config entries may subscribe to the same network. Each one
+    registers the devices it needs and the coordinator polls the union.
+    The coordinator ticks when the next device is due, at least every
+    minimum poll interval, and a PollScheduler decides which devices are
+    due on each tick. Reads are capped by the network's share of the
+    account's poll rate, so polling is spread out. While an event source
+    pushes status changes, polling drops to a slow consistency sweep. The
+    last statuses are saved so the next start can show them before the
+    first poll completes.
+    """
+
+    def __init__(self, hass: HomeAssistant, api_client: ConnectMeshAPI, network_id: str | None):
+        """Initialize the coordinator."""
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN}_{network_id}",
+            update_interval=timedelta(seconds=DEFAULT_MIN_POLL_INTERVAL),
+        )
+        self.api_client = api_client
+        self.network_id = network_id
+        self.scheduler = PollScheduler(DEFAULT_MIN_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL, POLL_JITTER)
+        # Status reads per second this network may poll, set by the registry
+        self.poll_rate: float | None = None
+        self._poll_allowance = 0.0
+        self._last_poll_started: float | None = None
+        self._consumers: dict[str, dict] = {}
+        self._update_lock = asyncio.Lock()
+        self._command_queues: dict[str, CommandQueue] = {}
+        self._pending: dict[str, PendingCommand] = {}
+        self._generation = 0
+        self._verify_tasks: set[asyncio.Task] = set()
+        self._store: Store[dict[str, Any]] = Store(
+            hass, SNAPSHOT_STORAGE_VERSION, snapshot_storage_key(network_id)
+        )
+        self.stale_devices: set[str] = set()
+        # Devices whose cached status changed in the latest update
+        self.changed_devices: set[str] = set()
+        self.poll_durations = LatencyHistogram()
+        self.last_poll_duration: float | None = None
+        self.last_poll_size = 0
+        self.last_event: float | None = None
+        self.events_received = 0
+        self.command_resends = 0
+        # When each device last had a status pushed
+        self._pushed: dict[str, float] = {}
+        # When each device's cached status was last read or pushed
+        self.updated_at: dict[str, float] = {}
+
+    @property
+    def device_ids(self) -> list[str]:
+        """Return the devices requested by any consumer, without duplicates."""
+        return list(dict.fromkeys(
+            unique_id
+            for consumer in self._consumers.values()
+            for unique_id in consumer["device_ids"]
+        ))
+
+    @property
+    def max_concurrency(self) -> int:
+        """Return the most conservative concurrency cap of all consumers."""
+        return min(
+            (consumer["max_concurrency"] for consumer in self._consumers.values()),
+            default=DEFAULT_MAX_CONCURRENCY,
+        )
+
+    @property
+    def status_timeout(self) -> float:
+        """Return the most lenient per-device timeout of all consumers."""
+        return max(
+            (consumer["status_timeout"] for consumer in self._consumers.values()),
+            default=DEFAULT_STATUS_TIMEOUT,
+        )
+
+    @property
+    def max_poll_rate(self) -> float:
+        """Return the lowest poll rate ceiling of all consumers."""
+        return min(
+            (consumer["max_poll_rate"] for consumer in self._consumers.values()),
+            default=DEFAULT_MAX_POLL_RATE,
+        )
+
+    @callback
+    def async_add_consumer(
+        self,
+        entry_id: str,
+        device_ids: list[str],
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        status_timeout: float = DEFAULT_STATUS_TIMEOUT,
+        min_poll_interval: float = DEFAULT_MIN_POLL_INTERVAL,
+        max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+        max_poll_rate: float = DEFAULT_MAX_POLL_RATE,
+        unacknowledged_devices: Iterable[str] = (),
+    ) -> bool:
+        """Register the devices a config entry needs.
+
+        Commands to ``unacknowledged_devices`` are sent without waiting for
+        the mesh and verified by status reads instead.
+        Returns True when the entry needs devices that are not cached yet.
+        """
+        self._consumers[entry_id] = {
+            "device_ids": list(device_ids),
+            "max_concurrency": max_concurrency,
+            "status_timeout": status_timeout,
+            "min_poll_interval": min_poll_interval,
+            "max_poll_interval": max_poll_interval,
+            "max_poll_rate": max_poll_rate,
+            "unacknowledged_devices": set(unacknowledged_devices),
+        }
+        self._async_update_schedule()
+        return self.data is None or any(unique_id not in self.data for unique_id in device_ids)
+
+    @callback
+    def async_update_consumer(
+        self, entry_id: str, device_ids: list[str], unacknowledged_devices: Iterable[str] = ()
+    ) -> None:
+        """Change the devices a config entry needs, keeping the other settings.
+
+        Devices that stay keep their cached status and polling schedule.
+        """
+        consumer = self._consumers[entry_id]
+        previous = consumer["device_ids"]
+        consumer["device_ids"] = list(device_ids)
+        consumer["unacknowledged_devices"] = set(unacknowledged_devices)
+        self._async_forget_devices(set(previous).difference(self.device_ids))
+
+    @callback
+    def async_remove_consumer(self, entry_id: str) -> bool:
+        """Unregister a config entry and return True if no consumer is left."""
+        if (consumer := self._consumers.pop(entry_id, None)) is not None:
+            self._async_forget_devices(set(consumer["device_ids"]).difference(self.device_ids))
+        self._async_update_schedule()
+        return not self._consumers
+
+    @callback
+    def _async_forget_devices(self, unique_ids: set[str]) -> None:
+        """Drop what is known about devices nobody polls anymore."""
+        self.scheduler.forget(unique_ids)
+        for unique_id in unique_ids:
+            self._pushed.pop(unique_id, None)
+            self.updated_at.pop(unique_id, None)
+            self.stale_devices.discard(unique_id)
+
+    @callback
+    def _async_update_schedule(self) -> None:
+        """Apply the tightest poll intervals requested by any consumer."""
+        if not self._consumers:
+            return
+        self.scheduler.floor = min(c["min_poll_interval"] for c in self._consumers.values())
+        self.scheduler.ceiling = min(c["max_poll_interval"] for c in self._consumers.values())
+        self.update_interval = timedelta(seconds=self.scheduler.floor)
+
+    def acknowledged(self, unique_id: str) -> bool:
+        """Return whether commands to a device wait for the mesh to confirm them.
+
+        A device shared by entries with different policies is acknowledged.
+        """
+        return not all(
+            unique_id in consumer["unacknowledged_devices"]
+            for consumer in self._consumers.values()
+            if unique_id in consumer["device_ids"]
+        )
+
+    @property
+    def command_queue_depth(self) -> int:
+        """Return the number of commands waiting to be sent."""
+        return sum(queue.depth for queue in self._command_queues.values())
+
+    def has_statuses(self, device_ids: list[str]) -> bool:
+        """Return True if every device has a cached status."""
+        return self.data is not None and all(self.data.get(unique_id) is not None for unique_id in device_ids)
+
+    def confirmed_state(self, unique_id: str) -> DeviceState | None:
+        """Return the cached state of a device, None while it shows an unconfirmed command."""
+        if unique_id in self._pending:
+            return None
+        return (self.data or {}).get(unique_id)
+
+    async def async_load_snapshot(self) -> None:
+        """Seed the cache with the statuses saved on the last run.
+
+        Only devices that are not cached yet are restored. They are stale
+        until a poll reads them again.
+        """
+        if (snapshot := await self._store.async_load()) is None:
+            return
+        data = dict(self.data or {})
+        restored = {
+            unique_id: DeviceState.from_status(status)
+            for unique_id, status in snapshot.get("statuses", {}).items()
+            if unique_id in self.device_ids and data.get(unique_id) is None
+        }
+        if restored:
+            _LOGGER.debug("Restored the status of %d devices from the snapshot", len(restored))
+            self.stale_devices.update(restored)
+            self.data = {**data, **restored}
+
+    @callback
+    def _async_save_snapshot(self) -> None:
+        """Save the cached statuses, batching writes."""
+        self._store.async_delay_save(self._snapshot_data, SNAPSHOT_SAVE_DELAY)
+
+    @callback
+    def _snapshot_data(self) -> dict[str, Any]:
+        """Return the statuses to save."""
+        return {
+            "statuses": {
+                unique_id: state.as_status()
+                for unique_id, state in (self.data or {}).items()
+                if state is not None
+            }
+        }
+
+    async def async_get_statuses(
+        self, device_ids: list[str], max_age: float
+    ) -> dict[str, DeviceState | None]:
+        """Return the status of devices, reading those not read in ``max_age`` seconds.
+
+        Stale devices are read concurrently and the results update the cache.
+        A device that cannot be read keeps its cached status.
+        """
+        started = time.monotonic()
+        stale = [
+            unique_id for unique_id in device_ids
+            if started - self.updated_at.get(unique_id, -math.inf) > max_age
+        ]
+        if stale:
+            statuses = await self.api_client.get_device_statuses(
+                stale, max_concurrency=self.max_concurrency, timeout=self.status_timeout
+            )
+            now = time.monotonic()
+            data = dict(self.data or {})
+            changed = set()
+            for unique_id, status in statuses.items():
+                if status is None or self._pushed.get(unique_id, 0) > started:
+                    continue
+                previous = data.get(unique_id)
+                self.scheduler.record(unique_id, status != previous, started)
+                if not self._async_accept_polled(unique_id, status, now):
+                    continue
+                if status != previous or unique_id in self.stale_devices:
+                    changed.add(unique_id)
+                data[unique_id] = status
+                self.updated_at[unique_id] = started
+                self.stale_devices.discard(unique_id)
+            if changed:
+                self.data = data
+                self.changed_devices = changed
+                self.async_update_listeners()
+                self._async_save_snapshot()
+        return {unique_id: (self.data or {}).get(unique_id) for unique_id in device_ids}
+
+    @callback
+    def async_minimal_command(self, unique_id: str, command: dict[str, Any]) -> dict[str, Any]:
+        """Return the part of a command the cached state does not show yet.
+
+        Only a status read or pushed in the last DEFAULT_STATUS_MAX_AGE
+        seconds, and not replaced by an unconfirmed command, is trusted;
+        otherwise the whole command is kept.
+        """
+        updated_at = self.updated_at.get(unique_id)
+        if (
+            unique_id in self.stale_devices
+            or unique_id in self._pending
+            or updated_at is None
+            or time.monotonic() - updated_at > DEFAULT_STATUS_MAX_AGE
+        ):
+            return dict(command)
+        return minimal_command((self.data or {}).get(unique_id), command)
+
+    async def async_send_command(self, unique_id: str, **command: Any) -> None:
+        """Send a command through the device's coalescing queue.
+
+        The expected state is shown right away and then confirmed by reading
+        the status of this device only.
+        """
+        generations = self._async_apply_optimistic({unique_id: command})
+        queue = self._async_command_queue(unique_id)
+        acknowledged = queue.acknowledged
+        try:
+            accepted = await queue.async_send(**command)
+        except ConnectMeshError as err:
+            self._async_schedule_verify(generations, accepted=False)
+            raise HomeAssistantError(str(err)) from err
+        self._async_schedule_verify(generations, accepted, acknowledged)
+
+    @callback
+    def _async_command_queue(self, unique_id: str) -> CommandQueue:
+        """Return the command queue of a device, creating it on first use."""
+        if (queue := self._command_queues.get(unique_id)) is None:
+            queue = CommandQueue(self.hass, self.api_client, unique_id, DEFAULT_COMMAND_WINDOW)
+            self._command_queues[unique_id] = queue
+        queue.acknowledged = self.acknowledged(unique_id)
+        return queue
+
+    async def async_restore(self, states: dict[str, DeviceState]) -> dict[str, bool]:
+        """Bring devices back to saved states with as few requests as possible.
+
+        Statuses too old to trust are read first. Devices already in their
+        saved state get no command and are left out of the returned
+        acceptance results.
+        """
+        await self.async_get_statuses(list(states), DEFAULT_STATUS_MAX_AGE)
+        commands = {
+            unique_id: command
+            for unique_id, state in states.items()
+            if (command := self.async_minimal_command(unique_id, command_for_state(state)))
+        }
+        if not commands:
+            return {}
+        return await self.async_set_many(commands)
+
+    async def async_set_many(self, commands: dict[str, dict[str, Any]]) -> dict[str, bool]:
+        """Send commands to many devices at once and verify them together."""
+        generations = self._async_apply_optimistic(commands)
+        unacknowledged = {unique_id for unique_id in commands if not self.acknowledged(unique_id)}
+        results = await self.api_client.set_many(
+            commands, max_concurrency=self.max_concurrency, unacknowledged=unacknowledged
+        )
+        for accepted in (True, False):
+            for acknowledged in (True, False):
+                self._async_schedule_verify(
+                    {unique_id: generation for unique_id, generation in generations.items()
+                     if results.get(unique_id, False) is accepted
+                     and (unique_id not in unacknowledged) is acknowledged},
+                    accepted,
+                    acknowledged,
+                )
+        return results
+
+    @callback
+    def async_cancel_commands(self) -> None:
+        """Cancel the commands that are not sent or verified yet."""
+        for queue in self._command_queues.values():
+            queue.cancel()
+        self._command_queues.clear()
+        for task in self._verify_tasks:
+            task.cancel()
+        self._pending.clear()
+
+    @callback
+    def _async_apply_optimistic(self, commands: dict[str, dict[str, Any]]) -> dict[str, int]:
+        """Record pending commands and show their expected state right away.
+
+        Returns the generation of each pending command so a verification can
+        tell when a newer command superseded the one it was checking.
+        """
+        deadline = time.monotonic() + PENDING_COMMAND_TIMEOUT
+        data = dict(self.data or {})
+        generations = {}
+        for unique_id, command in commands.items():
+            if (pending := self._pending.get(unique_id)) is not None:
+                command = merge_command(pending.command, command)
+            self._generation += 1
+            expected = expected_state(command)
+            self._pending[unique_id] = PendingCommand(command, expected, self._generation, deadline)
+            data[unique_id] = replace(data.get(unique_id) or DeviceState(), **expected)
+            generations[unique_id] = self._generation
+        self.data = data
+        self.changed_devices = set(commands)
+        self.async_update_listeners()
+        return generations
+
+    @callback
+    def _async_schedule_verify(
+        self, generations: dict[str, int], accepted: bool, acknowledged: bool = True
+    ) -> None:
+        """Verify pending commands in the background.
+
+        Unacknowledged commands may not have reached the device, so they are
+        checked sooner and resent when a read shows they were missed.
+        """
+        if not generations:
+            return
+        if not accepted:
+            delays = VERIFY_DELAYS_REJECTED
+        elif acknowledged:
+            delays = VERIFY_DELAYS_ACKNOWLEDGED
+        else:
+            delays = VERIFY_DELAYS_UNACKNOWLEDGED
+        resend = accepted and not acknowledged
+        task = self.hass.async_create_background_task(
+            self._async_verify(generations, delays, resend), f"{self.name} command verification"
+        )
+        self._verify_tasks.add(task)
+        task.add_done_callback(self._verify_tasks.discard)
+
+    async def _async_verify(
+        self, generations: dict[str, int], delays: tuple[float, ...], resend: bool = False
+    ) -> None:
+        """Confirm pending commands by reading the status of those devices.
+
+        Devices are read after each delay until they report the expected
+        state. With ``resend``, the command of a device that reports another
+        state is sent again, unacknowledged, before the next read. After the
+        last attempt the reported state wins, so a command that did not take
+        effect does not leave a wrong optimistic state.
+        """
+        remaining = dict(generations)
+        for attempt, delay in enumerate(delays):
+            await asyncio.sleep(delay)
+            remaining = {
+                unique_id: generation
+                for unique_id, generation in remaining.items()
+                if (pending := self._pending.get(unique_id)) is not None and pending.generation == generation
+            }
+            if not remaining:
+                return
+            statuses = await self.api_client.get_device_statuses(
+                list(remaining),
+                max_concurrency=self.max_concurrency,
+                timeout=self.status_timeout,
+                priority=PRIORITY_VERIFY,
+            )
+            last_attempt = attempt == len(delays) - 1
+            now = time.monotonic()
+            data = dict(self.data or {})
+            changed = set()
+            for unique_id, status in statuses.items():
+                pending = self._pending.get(unique_id)
+                if pending is None or pending.generation != remaining[unique_id]:
+                    continue
+                if state_matches(status, pending.expected):
+                    _LOGGER.debug("Device %s confirmed %s", unique_id, pending.command)
+                elif last_attempt and status is not None:
+                    _LOGGER.debug("Device %s did not apply %s", unique_id, pending.command)
+                else:
+                    continue
+                del self._pending[unique_id]
+                remaining.pop(unique_id)
+                if status != data.get(unique_id) or unique_id in self.stale_devices:
+                    changed.add(unique_id)
+                data[unique_id] = status
+                self.updated_at[unique_id] = now
+                self.stale_devices.discard(unique_id)
+                self.scheduler.record(unique_id, True, now)
+            self.data = data
+            if changed:
+                self.changed_devices = changed
+                self.async_update_listeners()
+                self._async_save_snapshot()
+            if resend and not last_attempt:
+                await self._async_resend(remaining, statuses)
+
+    @callback
+    def async_apply_events(self, statuses: dict[str, dict[str, Any]]) -> None:
+        """Apply partial statuses pushed by an event source.
+
+        Devices of other networks are ignored. Receiving events, or an empty
+        heartbeat, moves polling to the consistency sweep.
+        """
+        now = time.monotonic()
+        if self.scheduler.sweep is None:
+            _LOGGER.info("Receiving events for network %s, polling every %ss", self.network_id, EVENT_SWEEP_INTERVAL)
+            self.scheduler.sweep = EVENT_SWEEP_INTERVAL
+        self.last_event = now
+        data = dict(self.data or {})
+        changed = set()
+        for unique_id in set(statuses).intersection(self.device_ids):
+            self.events_received += 1
+            previous = data.get(unique_id)
+            status = (previous or DeviceState()).updated(statuses[unique_id])
+            if not self._async_accept_polled(unique_id, status, now):
+                continue
+            # Only an applied event makes polls that started earlier outdated
+            self._pushed[unique_id] = now
+            self.scheduler.record(unique_id, True, now)
+            if status != previous or unique_id in self.stale_devices:
+                changed.add(unique_id)
+            data[unique_id] = status
+            self.updated_at[unique_id] = now
+            self.stale_devices.discard(unique_id)
+        if changed:
+            self.data = data
+            self.changed_devices = changed
+            self.async_update_listeners()
+            self._async_save_snapshot()
+
+    @callback
+    def _async_check_events(self, now: float) -> None:
+        """Resume polling when the event source went silent."""
+        if self.scheduler.sweep is None or now - self.last_event < EVENT_SILENCE_TIMEOUT:
+            return
+        _LOGGER.warning(
+            "No events for network %s in %ss, polling its devices again", self.network_id, EVENT_SILENCE_TIMEOUT
+        )
+        self.scheduler.sweep = None
+        # Changes may have been missed, so every device is due right away
+        self.scheduler.forget(self.device_ids)
+
+    async def _async_resend(self, generations: dict[str, int], statuses: dict[str, DeviceState | None]) -> None:
+        """Send again the pending commands that a status read showed were missed.
+
+        A command is resent at most MAX_COMMAND_RESENDS times, and no more
+        once a resend left the device reporting the same status: the device
+        cannot reach the expected state and resending would not converge.
+        Resends go through the device's command queue, so they are never
+        sent after a newer command to the same device.
+        """
+        missed = {}
+        for unique_id, generation in generations.items():
+            status = statuses.get(unique_id)
+            pending = self._pending.get(unique_id)
+            if status is None or pending is None or pending.generation != generation:
+                continue
+            if pending.resends >= MAX_COMMAND_RESENDS or (pending.resends and status == pending.resent_after):
+                continue
+            pending.resends += 1
+            pending.resent_after = status
+            missed[unique_id] = pending.command
+        if not missed:
+            return
+        _LOGGER.debug("Resending missed commands to %s", ", ".join(missed))
+        self.command_resends += len(missed)
+
+        async def async_resend(unique_id: str, command: dict[str, Any]) -> None:
+            if (pending := self._pending.get(unique_id)) is None or pending.generation != generations[unique_id]:
+                # A newer command was sent in the meantime
+                return
+            try:
+                await self._async_command_queue(unique_id).async_send(**command)
+            except (TimeoutError, aiohttp.ClientError, ConnectMeshError) as err:
+                _LOGGER.warning("Error resending command to device %s: %s", unique_id, err)
+
+        await asyncio.gather(*(async_resend(unique_id, command) for unique_id, command in missed.items()))
+
+    @callback
+    def _async_accept_polled(self, unique_id: str, status: DeviceState | None, now: float) -> bool:
+        """Return whether a polled or pushed status may replace the cached one.
+
+        A status can race a command that is still in flight or unverified;
+        it then only wins if it shows the commanded state or the command
+        expired without being confirmed.
+        """
+        if (pending := self._pending.get(unique_id)) is None:
+            return True
+        if state_matches(status, pending.expected) or now > pending.deadline:
+            del self._pending[unique_id]
+            return True
+        return False
+
+    async def _async_update_data(self) -> dict[str, DeviceState | None]:
+        """Fetch the status of the devices that are due."""
+        # Overlapping refreshes (e.g. two entries set up at once) must see
+        # each other's results instead of fetching the same devices twice.
+        async with self._update_lock:
+            # A failed update only changes availability, not device states
+            self.changed_devices = set()
+            return await self._async_poll_due_devices()
+
+    async def _async_poll_due_devices(self) -> dict[str, DeviceState | None]:
+        """Fetch the due devices and merge them into the cached statuses."""
+        circuit_breaker = self.api_client.circuit_breaker
+        if circuit_breaker.is_open:
+            raise UpdateFailed(
+                f"Connect Mesh cloud unavailable, retrying in {circuit_breaker.retry_in:.0f}s"
+            )
+
+        started = time.monotonic()
+        self._async_check_events(started)
+        previous = self.data or {}
+        device_ids = self.device_ids
+        due = self.scheduler.due(device_ids, started, self._async_poll_budget(started))
+        self._poll_allowance -= len(due)
+        # Devices that have no status at all are read right away
+        due += [unique_id for unique_id in device_ids if unique_id not in previous and unique_id not in due]
+        self._last_poll_started = started
+        statuses = {}
+        if due:
+            statuses = await self.api_client.get_device_statuses(
+                due,
+                max_concurrency=self.max_concurrency,
+                timeout=self.status_timeout,
+                hedge=True,
+            )
+            self.last_poll_duration = time.monotonic() - started
+            self.last_poll_size = len(due)
+            self.poll_durations.observe(self.last_poll_duration)
+            if circuit_breaker.is_open:
+                # Keep the devices due so they are polled once the cloud recovers
+                raise UpdateFailed("Connect Mesh cloud stopped responding during the poll")
+
+        # Commands may have changed the cache while the poll was in flight
+        previous = self.data or {}
+        data = {unique_id: previous.get(unique_id) for unique_id in self.device_ids}
+        now = time.monotonic()
+        changed_devices = set()
+        for unique_id, status in statuses.items():
+            if self._pushed.get(unique_id, 0) > started:
+                # An event during the poll is newer than what it read
+                continue
+            changed = status != previous.get(unique_id)
+            self.scheduler.record(unique_id, changed, started)
+            if status is not None and unique_id in self.stale_devices:
+                self.stale_devices.discard(unique_id)
+                changed_devices.add(unique_id)
+            if self._async_accept_polled(unique_id, status, now):
+                data[unique_id] = status
+                if status is not None:
+                    self.updated_at[unique_id] = started
+                if changed:
+                    changed_devices.add(unique_id)
+
+        if data and all(status is None for status in data.values()):
+            raise UpdateFailed("Failed to get the status of any device")
+        self.changed_devices = changed_devices
+        if changed_devices:
+            # Written once the new data is in place, as the save is delayed
+            self._async_save_snapshot()
+        self._async_schedule_next_tick()
+        return data
+
+    @callback
+    def _async_poll_budget(self, now: float) -> int | None:
+        """Return how many devices this tick may read under the poll rate.
+
+        Unused reads carry over, up to one minimum poll interval's worth.
+        """
+        if self.poll_rate is None:
+            return None
+        elapsed = self.scheduler.floor
+        if self._last_poll_started is not None:
+            elapsed = now - self._last_poll_started
+        self._poll_allowance = min(
+            max(1.0, self.poll_rate * self.scheduler.floor),
+            self._poll_allowance + self.poll_rate * elapsed,
+        )
+        return int(self._poll_allowance)
+
+    @callback
+    def _async_schedule_next_tick(self) -> None:
+        """Tick again when the next device is due.
+
+        As the schedules of devices drift apart, polling turns into small
+        reads spread over the interval instead of one burst per interval.
+        """
+        next_due = self.scheduler.next_due(self.device_ids)
+        delay = self.scheduler.floor if next_due is None else next_due - time.monotonic()
+        self.update_interval = timedelta(seconds=min(self.scheduler.floor, max(MIN_POLL_TICK, delay)))
+
+
+def snapshot_storage_key(network_id: str | None) -> str:
+    """Return the storage key of a network's status snapshot."""
+    return f"{DOMAIN}.{network_id}"
+
+
+class ConnectMeshRegistry:
+    """Own the API clients and coordinators shared by all config entries.
+
+    There is one coordinator per token and network, so a device is fetched
+    once per cycle however many entries or platforms use it. Each network
+    also gets its own API client, so its circuit breaker and counters are
+    isolated from the other networks. The clients of a token share its
+    request scheduler, which enforces the rate limit and serves commands
+    first, and all clients share one pooled HTTP session. A traffic
+    recording covers every client until it ends, Home Assistant stops or
+    the last entry is unloaded, whichever comes first.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the registry."""
+        self.hass = hass
+        self.api_clients: dict[tuple[str, str | None], ConnectMeshAPI] = {}
+        self.request_schedulers: dict[str, RequestScheduler] = {}
+        self.coordinators: dict[tuple[str, str | None], ConnectMeshCoordinator] = {}
+        self.recorder: TrafficRecorder | None = None
+        self._trace_path: Path | None = None
+        self._unsub_recording: list[CALLBACK_TYPE] = []
+        self._session: aiohttp.ClientSession | None = None
+        self._unsub_close: CALLBACK_TYPE | None = None
+
+    @callback
+    def _async_get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled session, creating it on first use."""
+        if self._session is None:
+            self._session = async_create_transport(self.hass)
+            self._unsub_close = self.hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_CLOSE, self._async_close_session
+            )
+        return self._session
+
+    @callback
+    def _async_close_session(self, event: Event | None = None) -> None:
+        """Close the pooled session."""
+        if self._unsub_close is not None and event is None:
+            self._unsub_close()
+        self._unsub_close = None
+        if self._session is not None:
+            self.hass.async_create_task(self._session.close())
+            self._session = None
+        # Clients of the closed session, e.g. left by a config flow
+        self.api_clients.clear()
+        self.request_schedulers.clear()
+
+    @callback
+    def async_get_api_client(self, api_token: str, network_id: str | None = None) -> ConnectMeshAPI:
+        """Return the API client for a token and network, creating it if needed.
+
+        The connections of a token are warmed up when its first client is
+        created. Account-wide calls use the client without a network.
+        """
+        key = (api_token, network_id)
+        if (api_client := self.api_clients.get(key)) is None:
+            if (scheduler := self.request_schedulers.get(api_token)) is None:
+                scheduler = self.request_schedulers[api_token] = RequestScheduler(
+                    TokenBucket(DEFAULT_RATE_LIMIT, DEFAULT_RATE_BURST), CONNECTION_LIMIT_PER_HOST
+                )
+                warm_up = True
+            else:
+                warm_up = False
+            api_client = ConnectMeshAPI(self._async_get_session(), api_token, scheduler=scheduler)
+            api_client.recorder = self.recorder
+            self.api_clients[key] = api_client
+            if warm_up:
+                self.hass.async_create_background_task(
+                    api_client.async_warm_up(), "hafele_connect_mesh connection warm-up"
+                )
+        return api_client
+
+    @callback
+    def async_set_recorder(self, recorder: TrafficRecorder | None) -> None:
+        """Record the traffic of every API client to a recorder, or stop with None."""
+        self.recorder = recorder
+        for api_client in self.api_clients.values():
+            api_client.recorder = recorder
+
+    @callback
+    def async_start_recording(self, path: Path, duration: float) -> None:
+        """Record the traffic of every API client, then write it to ``path``."""
+        self.async_set_recorder(TrafficRecorder())
+        self._trace_path = path
+        self._unsub_recording = [
+            async_call_later(self.hass, duration, self.async_stop_recording),
+            self.hass.bus.async_listen(EVENT_HOMEASSISTANT_STOP, self.async_stop_recording),
+        ]
+
+    @callback
+    def async_stop_recording(self, *_: Any) -> None:
+        """Stop recording, if recording, and write the trace in the background."""
+        if (recorder := self.recorder) is None:
+            return
+        for unsub in self._unsub_recording:
+            unsub()
+        self._unsub_recording = []
+        self.async_set_recorder(None)
+        self.hass.async_create_task(
+            self._async_write_trace(recorder, self._trace_path), f"{DOMAIN} trace write"
+        )
+
+    async def _async_write_trace(self, recorder: TrafficRecorder, path: Path) -> None:
+        """Write a finished recording."""
+        written = await self.hass.async_add_executor_job(recorder.write, path)
+        _LOGGER.info("Wrote %d Connect Mesh requests to %s", written, path)
+
+    @callback
+    def async_get_coordinator(self, api_token: str, network_id: str | None) -> ConnectMeshCoordinator:
+        """Return the coordinator for a network, creating it if needed."""
+        key = (api_token, network_id)
+        if (coordinator := self.coordinators.get(key)) is None:
+            coordinator = ConnectMeshCoordinator(
+                self.hass, self.async_get_api_client(api_token, network_id), network_id
+            )
+            self.coordinators[key] = coordinator
+        return coordinator
+
+    @callback
+    def async_balance_poll_rates(self, api_token: str) -> None:
+        """Split the poll rate ceiling of an account between its networks.
+
+        The lowest ceiling of the account's entries applies, and each
+        network gets a share proportional to its number of devices.
+        """
+        coordinators = [c for (token, _), c in self.coordinators.items() if token == api_token]
+        ceiling = min((c.max_poll_rate for c in coordinators), default=DEFAULT_MAX_POLL_RATE)
+        total = sum(len(c.device_ids) for c in coordinators)
+        for coordinator in coordinators:
+            coordinator.poll_rate = ceiling * len(coordinator.device_ids) / total if total else ceiling
+
+    @callback
+    def async_release(self, coordinator: ConnectMeshCoordinator, entry_id: str) -> None:
+        """Unsubscribe a config entry and drop what nobody uses anymore."""
+        if not coordinator.async_remove_consumer(entry_id):
+            self.async_balance_poll_rates(coordinator.api_client.api_token)
+            return
+        coordinator.async_cancel_commands()
+        api_token = coordinator.api_client.api_token
+        key = (api_token, coordinator.network_id)
+        self.coordinators.pop(key, None)
+        self.api_clients.pop(key, None)
+        if any(token == api_token for token, _ in self.coordinators):
+            self.async_balance_poll_rates(api_token)
+        else:
+            self.api_clients.pop((api_token, None), None)
+            self.request_schedulers.pop(api_token, None)
+        if not self.coordinators:
+            self.async_stop_recording()
+            self._async_close_session()
+
+    @callback
+    def async_release_api_client(self, api_token: str) -> None:
+        """Drop the account client of a token no coordinator uses, such as a config flow's.
+
+        The pooled session is closed once no client is left.
+        """
+        if any(token == api_token for token, _ in self.coordinators):
+            return
+        self.api_clients.pop((api_token, None), None)
+        self.request_schedulers.pop(api_token, None)
+        if not self.api_clients:
+            self._async_close_session()
+
+    @callback
+    def async_find_coordinator(self, unique_id: str) -> ConnectMeshCoordinator | None:
+        """Return the coordinator polling a device, if any."""
+        return next(
+            (c for c in self.coordinators.values() if unique_id in c.device_ids),
+            None,
+        )
+
+
+@callback
+def async_get_registry(hass: HomeAssistant) -> ConnectMeshRegistry:
+    """Return the registry, creating it on first use."""
+    if (registry := hass.data.get(DATA_REGISTRY)) is None:
+        registry = hass.data[DATA_REGISTRY] = ConnectMeshRegistry(hass)
+    return registry
@@ -0,0 +1,86 @@
+"""Diagnostics support for Häfele Connect Mesh."""
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_WEBHOOK_ID
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .coordinator import ConnectMeshCoordinator
+
+TO_REDACT = {"api_token", CONF_WEBHOOK_ID}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinators = hass.data[DOMAIN][entry.entry_id]["coordinators"]
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "networks": {
+            str(network_id): _network_diagnostics(coordinator)
+            for network_id, coordinator in coordinators.items()
+        },
+    }
+
+
+def _network_diagnostics(coordinator: ConnectMeshCoordinator) -> dict[str, Any]:
+    """Return diagnostics for the coordinator of one network."""
+    api_client = coordinator.api_client
+    circuit_breaker = api_client.circuit_breaker
+    data = coordinator.data or {}
+    return {
+        "api": {
+            "counters": dict(api_client.counters),
+            "latencies": {
+                endpoint: histogram.as_dict()
+                for endpoint, histogram in api_client.latencies.items()
+            },
+            "queue_waits": {
+                priority: histogram.as_dict()
+                for priority, histogram in api_client.queue_waits.items()
+            },
+            "scheduler": {
+                "in_flight": api_client.scheduler.in_flight,
+                "queued": api_client.scheduler.queued,
+            },
+            "circuit_breaker": {
+                "state": circuit_breaker.state,
+                "retry_in": circuit_breaker.retry_in,
+                "reset_timeout": circuit_breaker.reset_timeout,
+            },
+        },
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "update_interval": coordinator.update_interval.total_seconds() if coordinator.update_interval else None,
+            "max_concurrency": coordinator.max_concurrency,
+            "status_timeout": coordinator.status_timeout,
+            "poll_rate": coordinator.poll_rate,
+            "poll_durations": coordinator.poll_durations.as_dict(),
+            "last_poll_duration": coordinator.last_poll_duration,
+            "last_poll_size": coordinator.last_poll_size,
+            "command_queue_depth": coordinator.command_queue_depth,
+            "command_resends": coordinator.command_resends,
+            "stale_devices": sorted(coordinator.stale_devices),
+        },
+        "events": {
+            "received": coordinator.events_received,
+            "seconds_since_last": (
+                time.monotonic() - coordinator.last_event if coordinator.last_event is not None else None
+            ),
+            "sweep_interval": coordinator.scheduler.sweep,
+        },
+        "devices": {
+            unique_id: {
+                "status": state.as_status() if state is not None else None,
+                "poll_interval": coordinator.scheduler.interval(unique_id),
+            }
+            for unique_id, state in data.items()
+        },
+    }
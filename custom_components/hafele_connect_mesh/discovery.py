@@ -0,0 +1,87 @@
+"""Device discovery and classification for Häfele Connect Mesh."""
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from .api import ConnectMeshAPI
+from .const import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_STATUS_TIMEOUT,
+    DEVICE_TYPE_SWITCH,
+    DISCOVERY_RETRIES,
+    DISCOVERY_RETRY_DELAY,
+)
+from .models import DeviceState
+
+_LOGGER = logging.getLogger(__name__)
+
+DEVICE_TYPES = {
+    "Multiwhite": "temperature",
+    "RGB": "rgb",
+    "Light": "brightness",
+}
+
+
+def classify_device(state: DeviceState | None) -> str | None:
+    """Return the device type for a status, or None if it is unknown."""
+    if state is None:
+        return None
+    return DEVICE_TYPES.get(state.abstraction, DEVICE_TYPE_SWITCH)
+
+
+def devices_to_classify(devices: list[dict], known: list[dict]) -> list[dict]:
+    """Return the devices that are new, renamed, moved or not classified yet."""
+    known_by_id = {device["uniqueId"]: device for device in known}
+    return [
+        device
+        for device in devices
+        if (previous := known_by_id.get(device["uniqueId"])) is None
+        or previous["name"] != device["name"]
+        or previous.get("networkId") != device.get("networkId")
+        or not previous.get("classified", True)
+    ]
+
+
+async def async_classify_devices(
+    api_client: ConnectMeshAPI,
+    devices: list[dict],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    timeout: float = DEFAULT_STATUS_TIMEOUT,
+) -> list[dict]:
+    """Classify devices from their status, reading them concurrently.
+
+    Statuses that could not be read are retried with a growing delay.
+    Devices that still fail are returned as switches with ``classified``
+    set to False, so they can be offered for a retry or a later rescan.
+    """
+    types: dict[str, str] = {}
+    remaining = [device["uniqueId"] for device in devices]
+    for attempt in range(DISCOVERY_RETRIES + 1):
+        if attempt:
+            _LOGGER.debug("Retrying classification of %d devices", len(remaining))
+            await asyncio.sleep(DISCOVERY_RETRY_DELAY * 2 ** (attempt - 1))
+        statuses = await api_client.get_device_statuses(
+            remaining, max_concurrency=max_concurrency, timeout=timeout
+        )
+        for unique_id, status in statuses.items():
+            if (device_type := classify_device(status)) is not None:
+                types[unique_id] = device_type
+        remaining = [unique_id for unique_id in remaining if unique_id not in types]
+        if not remaining:
+            break
+
+    classified = []
+    for device in devices:
+        entry = {"uniqueId": device["uniqueId"], "name": device["name"], "networkId": device.get("networkId")}
+        if (device_type := types.get(device["uniqueId"])) is not None:
+            entry["type"] = device_type
+        else:
+            _LOGGER.warning(
+                "Could not read the status of %s, adding it as a switch until it is rescanned",
+                device["name"],
+            )
+            entry["type"] = DEVICE_TYPE_SWITCH
+            entry["classified"] = False
+        classified.append(entry)
+    return classified
@@ -0,0 +1,124 @@
+"""Base entity for Häfele Connect Mesh devices."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import DOMAIN, SIGNAL_DEVICES_CHANGED
+from .coordinator import ConnectMeshCoordinator
+from .models import DeviceChanges, DeviceState
+
+
+@callback
+def async_setup_device_entities(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+    create_entity: Callable[[dict], ConnectMeshEntity | None],
+) -> None:
+    """Add the entities of an entry's devices and follow its device list.
+
+    ``create_entity`` returns the entity of a device, or None when the
+    device belongs to another platform.
+    """
+    entities: dict[str, ConnectMeshEntity] = {}
+
+    @callback
+    def async_add_devices(devices: list[dict]) -> None:
+        new_entities = []
+        for device in devices:
+            if (entity := create_entity(device)) is not None:
+                entities[device["uniqueId"]] = entity
+                new_entities.append(entity)
+        async_add_entities(new_entities)
+
+    async def async_devices_changed(changes: DeviceChanges) -> None:
+        registry = er.async_get(hass)
+        removals = []
+        for unique_id in changes.removed:
+            if (entity := entities.pop(unique_id, None)) is None:
+                continue
+            if unique_id in changes.deleted and entity.registry_entry is not None:
+                # Removing the registry entry also removes the entity
+                registry.async_remove(entity.entity_id)
+            else:
+                removals.append(entity.async_remove(force_remove=True))
+        # A device that moved is added again under the same unique ID
+        await asyncio.gather(*removals)
+        for unique_id, device in changes.renamed.items():
+            if (entity := entities.get(unique_id)) is not None:
+                entity.async_update_device(device)
+        async_add_devices(changes.added)
+
+    async_add_devices(hass.data[DOMAIN][entry.entry_id]["devices"])
+    entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_DEVICES_CHANGED.format(entry.entry_id), async_devices_changed)
+    )
+
+
+class ConnectMeshEntity(CoordinatorEntity[ConnectMeshCoordinator]):
+    """An entity backed by the cached status of one device.
+
+    The entity only writes its state when its own device changed or its
+    availability flipped, so an unchanged poll costs no state writes.
+    """
+
+    def __init__(self, coordinator: ConnectMeshCoordinator, device: dict):
+        """Initialize the entity from its device entry."""
+        super().__init__(coordinator)
+        self._device = device
+        self._attr_unique_id = device["uniqueId"]
+        self._attr_name = device["name"]
+        self._written_available: bool | None = None
+        self._update_from_status()
+
+    @property
+    def available(self) -> bool:
+        """Return if the last poll returned a status for this device."""
+        return super().available and self.device_state is not None
+
+    @property
+    def assumed_state(self) -> bool:
+        """Return True while the state comes from the saved snapshot."""
+        return self._attr_unique_id in self.coordinator.stale_devices
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state if this device changed or became (un)available."""
+        if (
+            self._attr_unique_id not in self.coordinator.changed_devices
+            and self.available is self._written_available
+        ):
+            return
+        self._update_from_status()
+        self.async_write_ha_state()
+
+    @callback
+    def async_write_ha_state(self) -> None:
+        """Write the state and remember the availability that was written."""
+        self._written_available = self.available
+        super().async_write_ha_state()
+
+    @callback
+    def async_update_device(self, device: dict) -> None:
+        """Apply a new device entry, e.g. after the device was renamed."""
+        self._device = device
+        self._attr_name = device["name"]
+        if self.registry_entry is not None:
+            er.async_get(self.hass).async_update_entity(self.entity_id, original_name=device["name"])
+        self.async_write_ha_state()
+
+    @property
+    def device_state(self) -> DeviceState | None:
+        """Return the cached state of the device."""
+        return (self.coordinator.data or {}).get(self._attr_unique_id)
+
+    def _update_from_status(self) -> None:
+        """Update the entity attributes from the cached status."""
@@ -0,0 +1,101 @@
+"""Pushed device status events for Häfele Connect Mesh."""
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+import logging
+from typing import Any
+
+from aiohttp import web
+from aiohttp.hdrs import METH_POST
+from homeassistant.components import webhook
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+EventCallback = Callable[[dict[str, dict[str, Any]]], None]
+
+
+def parse_events(payload: Any) -> dict[str, dict[str, Any]]:
+    """Return the partial status of each device in an event payload.
+
+    A payload is one event, a list of events or ``{"events": [...]}``. An
+    event has the shape of a status plus the device ``uniqueId``, with only
+    the values that changed. Later events of a device win. An empty list is
+    a valid heartbeat.
+    """
+    if isinstance(payload, dict) and "events" in payload:
+        payload = payload["events"]
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list):
+        raise ValueError("Expected an event or a list of events")
+    statuses: dict[str, dict[str, Any]] = {}
+    for event in payload:
+        if not isinstance(event, dict) or not isinstance(event.get("uniqueId"), str):
+            raise ValueError("Event without a device uniqueId")
+        if not isinstance(event.get("state", {}), dict):
+            raise ValueError("Event state must be an object")
+        status = statuses.setdefault(event["uniqueId"], {"state": {}})
+        status["state"].update(event.get("state") or {})
+        if event.get("abstraction") is not None:
+            status["abstraction"] = event["abstraction"]
+    return statuses
+
+
+class EventSource(ABC):
+    """A long-lived source of device status events.
+
+    Sources hand the parsed events of a payload to ``on_events``, which is
+    called from the event loop. Any call, even without events, tells the
+    coordinators that the source is alive.
+    """
+
+    def __init__(self, on_events: EventCallback):
+        """Initialize the event source."""
+        self.on_events = on_events
+
+    @abstractmethod
+    async def async_start(self) -> None:
+        """Start receiving events."""
+
+    @abstractmethod
+    async def async_stop(self) -> None:
+        """Stop receiving events."""
+
+
+class WebhookEventSource(EventSource):
+    """Receive events posted to a Home Assistant webhook."""
+
+    def __init__(self, hass: HomeAssistant, webhook_id: str, name: str, on_events: EventCallback):
+        """Initialize the webhook event source."""
+        super().__init__(on_events)
+        self.hass = hass
+        self.webhook_id = webhook_id
+        self.name = name
+
+    async def async_start(self) -> None:
+        """Register the webhook."""
+        webhook.async_register(
+            self.hass, DOMAIN, self.name, self.webhook_id, self._async_handle_webhook,
+            allowed_methods=[METH_POST],
+        )
+
+    async def async_stop(self) -> None:
+        """Unregister the webhook."""
+        webhook.async_unregister(self.hass, self.webhook_id)
+
+    async def _async_handle_webhook(
+        self, hass: HomeAssistant, webhook_id: str, request: web.Request
+    ) -> web.Response:
+        """Apply the events of a posted payload."""
+        try:
+            statuses = parse_events(await request.json())
+        except ValueError as err:
+            _LOGGER.warning("Ignoring invalid Connect Mesh event payload: %s", err)
+            return web.Response(status=400)
+        _LOGGER.debug("Received events for %d devices", len(statuses))
+        self.on_events(statuses)
+        return web.Response(status=200)
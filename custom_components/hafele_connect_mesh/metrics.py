@@ -0,0 +1,115 @@
+"""Latency metrics for Häfele Connect Mesh."""
+from __future__ import annotations
+
+import math
+from collections import deque
+from collections.abc import Iterable
+from typing import Any
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+
+class LatencyHistogram:
+    """Count durations in fixed buckets.
+
+    Memory stays constant however many requests are observed; percentiles
+    are estimated as the upper bound of the bucket they fall in.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        """Initialize an empty histogram."""
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Record one duration."""
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: LatencyHistogram) -> None:
+        """Add the observations of another histogram."""
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    @classmethod
+    def combined(cls, histograms: Iterable[LatencyHistogram]) -> LatencyHistogram:
+        """Return a histogram of the observations of several others."""
+        result = cls()
+        for histogram in histograms:
+            result.merge(histogram)
+        return result
+
+    @property
+    def mean(self) -> float | None:
+        """Return the mean duration."""
+        return self.total / self.count if self.count else None
+
+    def percentile(self, quantile: float) -> float | None:
+        """Return an upper estimate of a percentile (quantile in 0-1)."""
+        if not self.count:
+            return None
+        threshold = quantile * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= threshold:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the histogram for diagnostics."""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.max,
+            "buckets": {
+                str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.counts)
+            },
+        }
+
+
+class LatencyWindow:
+    """Keep the most recent durations for exact percentiles.
+
+    Unlike LatencyHistogram, old observations age out, so percentiles
+    follow the current behaviour of the cloud.
+    """
+
+    __slots__ = ("samples",)
+
+    def __init__(self, size: int):
+        """Initialize an empty window of ``size`` durations."""
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        """Record one duration, dropping the oldest if the window is full."""
+        self.samples.append(seconds)
+
+    def percentile(self, quantile: float) -> float | None:
+        """Return a percentile (quantile in 0-1) of the durations in the window."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+def endpoint_name(method: str, path: str) -> str:
+    """Return the endpoint of a request, without device IDs."""
+    parts = path.strip("/").split("/")
+    if len(parts) == 3 and parts[0] == "devices":
+        parts[1] = "{id}"
+    return f"{method} /{'/'.join(parts)}"
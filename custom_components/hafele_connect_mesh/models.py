@@ -0,0 +1,97 @@
+"""Decoded device state for Häfele Connect Mesh."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field, replace
+from typing import Any
+
+from homeassistant.util.color import color_temperature_kelvin_to_mired
+
+API_LEVEL_MAX = 65535
+# Keys of the "state" object of a status
+_STATE_KEYS = ("power", "lightness", "temperature", "hue", "saturation")
+
+
+@dataclass(slots=True, frozen=True)
+class DeviceState:
+    """The state a device reports, decoded once per status read.
+
+    Values are kept in API units (lightness, hue and saturation 0-65535,
+    temperature in Kelvin). The values Home Assistant shows are computed
+    once here instead of on every entity update. Two states compare equal
+    when the device reports the same values.
+    """
+
+    abstraction: str | None = None
+    power: bool = False
+    lightness: int | None = None
+    temperature: int | None = None
+    hue: int | None = None
+    saturation: int | None = None
+    brightness: int | None = field(default=None, init=False, compare=False)
+    color_temp: int | None = field(default=None, init=False, compare=False)
+    hs_color: tuple[float, float] | None = field(default=None, init=False, compare=False)
+
+    def __post_init__(self) -> None:
+        """Compute the values Home Assistant uses."""
+        if self.lightness is not None:
+            object.__setattr__(self, "brightness", round(self.lightness / API_LEVEL_MAX * 255))
+        if self.temperature:
+            object.__setattr__(self, "color_temp", color_temperature_kelvin_to_mired(self.temperature))
+        if self.hue is not None and self.saturation is not None:
+            object.__setattr__(self, "hs_color", (
+                self.hue / API_LEVEL_MAX * 360,
+                self.saturation / API_LEVEL_MAX * 100,
+            ))
+
+    @classmethod
+    def from_status(cls, status: dict[str, Any]) -> DeviceState:
+        """Decode a status response."""
+        state = status.get("state") or {}
+        return cls(
+            abstraction=status.get("abstraction"),
+            power=bool(state.get("power", False)),
+            lightness=state.get("lightness"),
+            temperature=state.get("temperature"),
+            hue=state.get("hue"),
+            saturation=state.get("saturation"),
+        )
+
+    def updated(self, status: dict[str, Any]) -> DeviceState:
+        """Return the state with the values of a partial status applied.
+
+        Values missing from ``status`` are kept, so an event carrying only
+        the new power keeps the lightness already known.
+        """
+        changes = {key: value for key, value in (status.get("state") or {}).items() if key in _STATE_KEYS}
+        if "power" in changes:
+            changes["power"] = bool(changes["power"])
+        if status.get("abstraction") is not None:
+            changes["abstraction"] = status["abstraction"]
+        return replace(self, **changes) if changes else self
+
+    def as_status(self) -> dict[str, Any]:
+        """Return the state in the shape of a status response."""
+        state: dict[str, Any] = {"power": self.power}
+        for key in ("lightness", "temperature", "hue", "saturation"):
+            if (value := getattr(self, key)) is not None:
+                state[key] = value
+        return {"abstraction": self.abstraction, "state": state}
+
+
+@dataclass(slots=True)
+class DeviceChanges:
+    """Changes to the device list of a config entry, applied without a reload.
+
+    Entities of ``removed`` devices are taken down and those of ``added``
+    devices created; a device that moved to another network or changed type
+    is in both. ``deleted`` devices also leave the entity registry.
+    """
+
+    added: list[dict] = field(default_factory=list)
+    removed: set[str] = field(default_factory=set)
+    deleted: set[str] = field(default_factory=set)
+    renamed: dict[str, dict] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        """Return True if anything changed."""
+        return bool(self.added or self.removed or self.renamed)
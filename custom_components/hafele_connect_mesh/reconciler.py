@@ -0,0 +1,162 @@
+"""Device list reconciliation for Häfele Connect Mesh."""
+from __future__ import annotations
+
+from collections.abc import Callable
+from datetime import datetime, timedelta
+import logging
+
+import aiohttp
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant
+from homeassistant.helpers.event import async_track_time_interval
+
+from .api import ConnectMeshAPI, ConnectMeshError
+from .const import (
+    CONF_MAX_CONCURRENCY,
+    CONF_STATUS_TIMEOUT,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_STATUS_TIMEOUT,
+    DEVICE_RECONCILE_INTERVAL,
+    DEVICE_TYPE_SWITCH,
+)
+from .discovery import async_classify_devices
+from .models import DeviceChanges
+from .resilience import PRIORITY_BACKGROUND
+
+_LOGGER = logging.getLogger(__name__)
+
+# Called with the new device list, the remaining networks and what changed
+ApplyCallback = Callable[[list[dict], list[str], DeviceChanges], None]
+
+
+def diff_devices(known: list[dict], current: list[dict]) -> tuple[list[dict], DeviceChanges]:
+    """Return the new device list of an entry and what changed.
+
+    ``current`` holds the devices the cloud lists, already classified when
+    they are new, moved or were not classified before; the other devices
+    keep their known entry.
+    """
+    known_by_id = {device["uniqueId"]: device for device in known}
+    changes = DeviceChanges()
+    devices = []
+    for device in current:
+        unique_id = device["uniqueId"]
+        previous = known_by_id.get(unique_id)
+        if previous is None:
+            changes.added.append(device)
+        elif (device["type"] == DEVICE_TYPE_SWITCH) != (previous["type"] == DEVICE_TYPE_SWITCH):
+            # A light became a switch or the other way around: other platform
+            changes.removed.add(unique_id)
+            changes.deleted.add(unique_id)
+            changes.added.append(device)
+        elif device.get("networkId") != previous.get("networkId"):
+            changes.removed.add(unique_id)
+            changes.added.append(device)
+        elif device["name"] != previous["name"]:
+            changes.renamed[unique_id] = device
+        devices.append(device)
+    gone = set(known_by_id).difference(device["uniqueId"] for device in current)
+    changes.removed |= gone
+    changes.deleted |= gone
+    return devices, changes
+
+
+class DeviceReconciler:
+    """Keep the device list of a config entry in sync with the cloud.
+
+    Every DEVICE_RECONCILE_INTERVAL seconds the account's networks and
+    devices are fetched. Both lists are revalidated, so an unchanged
+    account costs two small requests and no decoding. New and moved
+    devices are classified, and the resulting list and changes are handed
+    to ``on_change`` to be applied to the running entry.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, api_client: ConnectMeshAPI, on_change: ApplyCallback):
+        """Initialize the reconciler."""
+        self.hass = hass
+        self.entry = entry
+        self.api_client = api_client
+        self.on_change = on_change
+        self._networks: list[dict] | None = None
+        self._devices: list[dict] | None = None
+        self._unsub: CALLBACK_TYPE | None = None
+
+    async def async_start(self) -> None:
+        """Start checking the device list periodically."""
+        self._unsub = async_track_time_interval(
+            self.hass,
+            self._async_scheduled_reconcile,
+            timedelta(seconds=DEVICE_RECONCILE_INTERVAL),
+            name=f"{self.entry.title} device reconciliation",
+        )
+
+    async def async_stop(self) -> None:
+        """Stop checking the device list."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    async def _async_scheduled_reconcile(self, now: datetime) -> None:
+        """Reconcile on schedule, logging failures instead of raising them."""
+        try:
+            await self.async_reconcile()
+        except (TimeoutError, aiohttp.ClientError, ConnectMeshError) as err:
+            _LOGGER.debug("Could not check the devices of %s: %s", self.entry.title, err)
+
+    async def async_reconcile(self) -> DeviceChanges | None:
+        """Fetch the account's devices and apply what changed.
+
+        Returns the changes, or None if the lists could not be fetched.
+        """
+        networks = await self.api_client.get_networks(PRIORITY_BACKGROUND)
+        devices = await self.api_client.get_devices(PRIORITY_BACKGROUND)
+        if networks is None or devices is None:
+            return None
+        if networks is self._networks and devices is self._devices:
+            return DeviceChanges()
+        self._networks, self._devices = networks, devices
+
+        data = self.entry.data
+        existing = {network["id"] for network in networks}
+        network_ids = [network_id for network_id in data["network_ids"] if network_id in existing]
+        if not network_ids:
+            _LOGGER.warning("The networks of %s no longer exist, keeping its devices", self.entry.title)
+            return None
+
+        known = {device["uniqueId"]: device for device in data["devices"]}
+        current = [device for device in devices if device.get("networkId") in network_ids]
+        to_classify = [
+            device
+            for device in current
+            if (previous := known.get(device["uniqueId"])) is None
+            or previous.get("networkId") != device.get("networkId")
+            or not previous.get("classified", True)
+        ]
+        classified = {}
+        if to_classify:
+            classified = {
+                device["uniqueId"]: device
+                for device in await async_classify_devices(
+                    self.api_client,
+                    to_classify,
+                    max_concurrency=self.entry.options.get(CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY),
+                    timeout=self.entry.options.get(CONF_STATUS_TIMEOUT, DEFAULT_STATUS_TIMEOUT),
+                )
+            }
+        current = [
+            classified.get(device["uniqueId"])
+            or {**known[device["uniqueId"]], "name": device["name"]}
+            for device in current
+        ]
+
+        new_devices, changes = diff_devices(data["devices"], current)
+        if new_devices != data["devices"] or network_ids != data["network_ids"]:
+            _LOGGER.info(
+                "Devices of %s changed: %d added, %d removed, %d renamed",
+                self.entry.title,
+                len(changes.added),
+                len(changes.removed),
+                len(changes.renamed),
+            )
+            self.on_change(new_devices, network_ids, changes)
+        return changes
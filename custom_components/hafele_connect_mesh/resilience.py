@@ -0,0 +1,220 @@
+"""Rate limiting, scheduling, retry and circuit breaking helpers for the Connect Mesh API."""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# Request priority classes, most urgent first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_VERIFY = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_VERIFY: "verify",
+    PRIORITY_BACKGROUND: "background",
+}
+
+
+class TokenBucket:
+    """Token-bucket rate limiter.
+
+    Tokens refill at ``rate`` per second up to ``capacity``; every request
+    takes one token and waits for it when the bucket is empty. Waiters are
+    served in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """Initialize the bucket, full."""
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """Take a token, waiting if needed, and return the time waited."""
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class RequestScheduler:
+    """Hand out request slots by priority class.
+
+    At most ``max_in_flight`` requests run at once and each one takes a
+    token from ``rate_limiter``. Waiting requests get their turn by priority,
+    then in arrival order, and only one waits for a slot or token at a time.
+    A command therefore waits for the requests already in flight and the one
+    being dispatched, never for the rest of a queued poll.
+    """
+
+    def __init__(self, rate_limiter: TokenBucket, max_in_flight: int):
+        """Initialize the scheduler."""
+        self.rate_limiter = rate_limiter
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._queue: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._sequence = itertools.count()
+        self._dispatching = False
+        self._slot_freed = asyncio.Event()
+
+    @property
+    def queued(self) -> int:
+        """Return the number of requests waiting for their turn."""
+        return sum(not future.done() for _, _, future in self._queue)
+
+    async def acquire(self, priority: int) -> float:
+        """Wait for a slot and a rate limit token and return the time waited.
+
+        Every acquire must be followed by a release once the request is done.
+        """
+        started = time.monotonic()
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future))
+        self._dispatch_next()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Cancelled right after getting the turn
+                self._end_turn()
+            raise
+        try:
+            while self.in_flight >= self.max_in_flight:
+                self._slot_freed.clear()
+                await self._slot_freed.wait()
+            await self.rate_limiter.acquire()
+            self.in_flight += 1
+        finally:
+            self._end_turn()
+        return time.monotonic() - started
+
+    def release(self) -> None:
+        """Free the slot of a finished request."""
+        self.in_flight -= 1
+        self._slot_freed.set()
+
+    def _end_turn(self) -> None:
+        """Let the next waiting request be dispatched."""
+        self._dispatching = False
+        self._dispatch_next()
+
+    def _dispatch_next(self) -> None:
+        """Give the turn to the most urgent waiting request."""
+        while not self._dispatching and self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                self._dispatching = True
+                future.set_result(None)
+
+
+class CircuitBreaker:
+    """Stop calling a cloud that keeps failing.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    requests are rejected for ``reset_timeout`` seconds. Then a single probe
+    is let through: success closes the circuit, failure opens it again for
+    twice as long, up to ``max_reset_timeout``. A probe abandoned before it
+    got an answer must be released, so the next request probes instead.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, max_reset_timeout: float):
+        """Initialize the breaker, closed."""
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def retry_in(self) -> float:
+        """Return how long until the next probe is allowed."""
+        if self.state != STATE_OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    @property
+    def is_open(self) -> bool:
+        """Return True while requests are being rejected."""
+        if self.state == STATE_OPEN:
+            return self.retry_in > 0
+        return self.state == STATE_HALF_OPEN and self._probe_in_flight
+
+    def allow_request(self) -> bool:
+        """Return whether a request may be sent now."""
+        if self.state == STATE_CLOSED:
+            return True
+        if self.state == STATE_OPEN and self.retry_in == 0:
+            self.state = STATE_HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == STATE_HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release_probe(self) -> None:
+        """Let another request probe after the probe was abandoned."""
+        if self.state == STATE_HALF_OPEN:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful request."""
+        self.state = STATE_CLOSED
+        self.reset_timeout = self.base_reset_timeout
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Count a failed request and return True if it opened the circuit."""
+        self._failures += 1
+        if self.state == STATE_HALF_OPEN:
+            self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+        elif self.state == STATE_OPEN or self._failures < self.failure_threshold:
+            return False
+        self.state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        return True
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Return a full-jitter exponential backoff delay for a retry attempt."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
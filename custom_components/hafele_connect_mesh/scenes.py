@@ -0,0 +1,42 @@
+"""Saved device states for the snapshot and restore services."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, SCENE_SAVE_DELAY, SCENE_STORAGE_VERSION
+from .models import DeviceState
+
+
+class SceneSnapshots:
+    """Named sets of device states, kept across restarts.
+
+    States are stored as statuses, the same shape the cloud reports.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        """Initialize the snapshots."""
+        self._store: Store[dict[str, Any]] = Store(hass, SCENE_STORAGE_VERSION, f"{DOMAIN}_scenes")
+        self._scenes: dict[str, dict[str, dict[str, Any]]] | None = None
+
+    async def _async_scenes(self) -> dict[str, dict[str, dict[str, Any]]]:
+        """Return the saved snapshots, loading them on first use."""
+        if self._scenes is None:
+            self._scenes = ((await self._store.async_load()) or {}).get("scenes", {})
+        return self._scenes
+
+    async def async_get(self, snapshot_id: str) -> dict[str, DeviceState] | None:
+        """Return the device states of a snapshot, None if it does not exist."""
+        if (scene := (await self._async_scenes()).get(snapshot_id)) is None:
+            return None
+        return {unique_id: DeviceState.from_status(status) for unique_id, status in scene.items()}
+
+    async def async_set(self, snapshot_id: str, states: dict[str, DeviceState]) -> dict[str, dict[str, Any]]:
+        """Save device states under a name and return them as statuses."""
+        scenes = await self._async_scenes()
+        scene = {unique_id: state.as_status() for unique_id, state in states.items()}
+        scenes[snapshot_id] = scene
+        self._store.async_delay_save(lambda: {"scenes": scenes}, SCENE_SAVE_DELAY)
+        return scene
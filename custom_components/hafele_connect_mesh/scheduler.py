@@ -0,0 +1,71 @@
+"""Per-device polling schedule for Häfele Connect Mesh."""
+from __future__ import annotations
+
+import random
+from collections.abc import Iterable
+
+
+class PollScheduler:
+    """Give every device its own polling interval.
+
+    A device is polled every ``floor`` seconds right after a command or an
+    observed change. Every poll that finds it unchanged doubles its interval,
+    up to ``ceiling`` seconds. While ``sweep`` is set, changes are pushed by
+    events and every device is only polled every ``sweep`` seconds.
+
+    Each next poll is moved earlier by up to ``jitter`` of the interval, so
+    devices polled together drift apart instead of staying in one burst.
+    """
+
+    def __init__(self, floor: float, ceiling: float, jitter: float = 0.0):
+        """Initialize the scheduler."""
+        self.floor = floor
+        self.ceiling = ceiling
+        self.jitter = jitter
+        self.sweep: float | None = None
+        self._intervals: dict[str, float] = {}
+        self._next_poll: dict[str, float] = {}
+
+    def due(self, unique_ids: Iterable[str], now: float, limit: int | None = None) -> list[str]:
+        """Return the devices that should be polled at ``now``.
+
+        With ``limit``, only that many devices are returned, the longest
+        overdue first.
+        """
+        due = [
+            unique_id
+            for unique_id in unique_ids
+            if self._next_poll.get(unique_id, now) <= now
+        ]
+        if limit is None or len(due) <= limit:
+            return due
+        due.sort(key=lambda unique_id: self._next_poll.get(unique_id, float("-inf")))
+        return due[:limit]
+
+    def next_due(self, unique_ids: Iterable[str]) -> float | None:
+        """Return when the first of these devices is due, None without devices."""
+        return min(
+            (self._next_poll.get(unique_id, float("-inf")) for unique_id in unique_ids),
+            default=None,
+        )
+
+    def record(self, unique_id: str, changed: bool, now: float) -> None:
+        """Schedule the next poll of a device after it has been polled."""
+        if self.sweep is not None:
+            interval = self.sweep
+        elif changed or unique_id not in self._intervals:
+            interval = self.floor
+        else:
+            interval = min(self.ceiling, max(self.floor, self._intervals[unique_id] * 2))
+        self._intervals[unique_id] = interval
+        self._next_poll[unique_id] = now + interval * (1 - random.uniform(0, self.jitter))
+
+    def interval(self, unique_id: str) -> float:
+        """Return the current polling interval of a device."""
+        return self._intervals.get(unique_id, self.floor)
+
+    def forget(self, unique_ids: Iterable[str]) -> None:
+        """Drop the schedule of devices that are no longer polled."""
+        for unique_id in unique_ids:
+            self._intervals.pop(unique_id, None)
+            self._next_poll.pop(unique_id, None)
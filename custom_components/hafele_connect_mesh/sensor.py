@@ -0,0 +1,149 @@
+"""Diagnostic sensors for Häfele Connect Mesh."""
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.typing import StateType
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import DOMAIN, MANUFACTURER
+from .coordinator import ConnectMeshCoordinator
+from .metrics import LatencyHistogram
+from .resilience import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+
+
+def _latency_ms(coordinator: ConnectMeshCoordinator, method: str) -> float | None:
+    """Return the p95 latency of an API method in milliseconds."""
+    histogram = LatencyHistogram.combined(
+        histogram
+        for endpoint, histogram in coordinator.api_client.latencies.items()
+        if endpoint.startswith(f"{method} ")
+    )
+    if (p95 := histogram.percentile(0.95)) is None:
+        return None
+    return round(p95 * 1000)
+
+
+@dataclass(frozen=True, kw_only=True)
+class ConnectMeshSensorEntityDescription(SensorEntityDescription):
+    """Describe a Connect Mesh diagnostic sensor."""
+
+    value_fn: Callable[[ConnectMeshCoordinator], StateType]
+
+
+SENSORS: tuple[ConnectMeshSensorEntityDescription, ...] = (
+    ConnectMeshSensorEntityDescription(
+        key="requests",
+        translation_key="requests",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda coordinator: coordinator.api_client.counters["requests"],
+    ),
+    ConnectMeshSensorEntityDescription(
+        key="failures",
+        translation_key="failures",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda coordinator: coordinator.api_client.counters["failures"],
+    ),
+    ConnectMeshSensorEntityDescription(
+        key="retries",
+        translation_key="retries",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda coordinator: coordinator.api_client.counters["retries"],
+    ),
+    ConnectMeshSensorEntityDescription(
+        key="status_latency",
+        translation_key="status_latency",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda coordinator: _latency_ms(coordinator, "GET"),
+    ),
+    ConnectMeshSensorEntityDescription(
+        key="command_latency",
+        translation_key="command_latency",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda coordinator: _latency_ms(coordinator, "PUT"),
+    ),
+    ConnectMeshSensorEntityDescription(
+        key="poll_duration",
+        translation_key="poll_duration",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        suggested_display_precision=2,
+        value_fn=lambda coordinator: coordinator.last_poll_duration,
+    ),
+    ConnectMeshSensorEntityDescription(
+        key="command_queue_depth",
+        translation_key="command_queue_depth",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda coordinator: coordinator.command_queue_depth,
+    ),
+    ConnectMeshSensorEntityDescription(
+        key="circuit_state",
+        translation_key="circuit_state",
+        device_class=SensorDeviceClass.ENUM,
+        options=[STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN],
+        value_fn=lambda coordinator: coordinator.api_client.circuit_breaker.state,
+    ),
+)
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback) -> None:
+    """Set up the Connect Mesh diagnostic sensors of every network."""
+    coordinators = hass.data[DOMAIN][entry.entry_id]["coordinators"]
+    async_add_entities(
+        ConnectMeshDiagnosticSensor(coordinator, entry, description)
+        for coordinator in coordinators.values()
+        for description in SENSORS
+    )
+
+
+class ConnectMeshDiagnosticSensor(CoordinatorEntity[ConnectMeshCoordinator], SensorEntity):
+    """Report how the integration talks to the Connect Mesh cloud."""
+
+    entity_description: ConnectMeshSensorEntityDescription
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_has_entity_name = True
+
+    def __init__(
+        self,
+        coordinator: ConnectMeshCoordinator,
+        entry: ConfigEntry,
+        description: ConnectMeshSensorEntityDescription,
+    ):
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self.entity_description = description
+        self._attr_unique_id = f"{entry.entry_id}_{coordinator.network_id}_{description.key}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, f"network_{coordinator.network_id}")},
+            name=f"Connect Mesh network {coordinator.network_id}",
+            manufacturer=MANUFACTURER,
+            entry_type=DeviceEntryType.SERVICE,
+        )
+
+    @property
+    def available(self) -> bool:
+        """Stay available while the cloud fails, that is what they report."""
+        return True
+
+    @property
+    def native_value(self) -> StateType:
+        """Return the current value."""
+        return self.entity_description.value_fn(self.coordinator)
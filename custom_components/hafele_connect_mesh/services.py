@@ -0,0 +1,287 @@
+"""Services for the Häfele Connect Mesh integration."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from pathlib import Path
+import time
+from typing import Any
+
+import voluptuous as vol
+from homeassistant.components.light import (
+    ATTR_BRIGHTNESS,
+    ATTR_COLOR_TEMP_KELVIN,
+    ATTR_HS_COLOR,
+)
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv, entity_registry as er
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    ATTR_HUE_SATURATION,
+    ATTR_LIGHTNESS,
+    ATTR_POWER,
+    ATTR_TEMPERATURE,
+    DEFAULT_STATUS_MAX_AGE,
+    DEFAULT_TRACE_DURATION,
+    DOMAIN,
+    MAX_KELVIN,
+    MAX_TRACE_DURATION,
+    MIN_KELVIN,
+)
+from .coordinator import ConnectMeshCoordinator, async_get_registry
+from .models import DeviceState
+from .scenes import SceneSnapshots
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_GET_DEVICE_STATUS = "get_device_status"
+SERVICE_SET_MANY = "set_many"
+SERVICE_SNAPSHOT = "snapshot"
+SERVICE_RESTORE = "restore"
+SERVICE_RECORD_TRAFFIC = "record_traffic"
+
+ATTR_DEVICE_ID = "device_id"
+ATTR_DEVICES = "devices"
+ATTR_MAX_AGE = "max_age"
+ATTR_SNAPSHOT_ID = "snapshot_id"
+ATTR_DURATION = "duration"
+
+GET_DEVICE_STATUS_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(ATTR_DEVICES): vol.All(cv.ensure_list, [cv.string]),
+            # A single device, also exposed as a state for older automations
+            vol.Optional(ATTR_DEVICE_ID): cv.string,
+            vol.Optional(ATTR_MAX_AGE, default=DEFAULT_STATUS_MAX_AGE): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+        }
+    ),
+    cv.has_at_least_one_key(ATTR_DEVICES, ATTR_DEVICE_ID),
+)
+
+SET_MANY_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_DEVICES): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(ATTR_POWER): cv.boolean,
+        vol.Optional(ATTR_BRIGHTNESS): vol.All(vol.Coerce(int), vol.Range(min=0, max=255)),
+        vol.Optional(ATTR_COLOR_TEMP_KELVIN): cv.positive_int,
+        vol.Optional(ATTR_HS_COLOR): vol.All(
+            vol.Coerce(tuple),
+            vol.ExactSequence(
+                (
+                    vol.All(vol.Coerce(float), vol.Range(min=0, max=360)),
+                    vol.All(vol.Coerce(float), vol.Range(min=0, max=100)),
+                )
+            ),
+        ),
+    }
+)
+
+SNAPSHOT_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_SNAPSHOT_ID): cv.string,
+        vol.Optional(ATTR_DEVICES): vol.All(cv.ensure_list, [cv.string]),
+    }
+)
+
+RECORD_TRAFFIC_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_DURATION, default=DEFAULT_TRACE_DURATION): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=MAX_TRACE_DURATION)
+        ),
+    }
+)
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the integration services."""
+    if hass.services.has_service(DOMAIN, SERVICE_SET_MANY):
+        return
+    registry = async_get_registry(hass)
+    scenes = SceneSnapshots(hass)
+
+    def resolve_device(device: str) -> tuple[str, ConnectMeshCoordinator]:
+        """Return the unique ID and coordinator of a device or light entity."""
+        unique_id = device
+        if "." in device:
+            entity = er.async_get(hass).async_get(device)
+            if entity is None or entity.platform != DOMAIN:
+                raise ServiceValidationError(f"Unknown Connect Mesh entity: {device}")
+            unique_id = entity.unique_id
+        coordinator = registry.async_find_coordinator(unique_id)
+        if coordinator is None:
+            raise ServiceValidationError(f"Unknown Connect Mesh device: {device}")
+        return unique_id, coordinator
+
+    def resolve_devices(devices: list[str] | None) -> dict[str, ConnectMeshCoordinator]:
+        """Return the coordinator of each device, every polled device by default."""
+        if devices is None:
+            return {
+                unique_id: coordinator
+                for coordinator in registry.coordinators.values()
+                for unique_id in coordinator.device_ids
+            }
+        return dict(resolve_device(device) for device in devices)
+
+    async def get_device_status(call: ServiceCall) -> ServiceResponse:
+        """Return the status of devices, reading only those cached too long ago."""
+        devices = list(call.data.get(ATTR_DEVICES, []))
+        if ATTR_DEVICE_ID in call.data:
+            devices.append(call.data[ATTR_DEVICE_ID])
+        resolved = {device: resolve_device(device) for device in devices}
+        batches: dict[ConnectMeshCoordinator, list[str]] = {}
+        for unique_id, coordinator in resolved.values():
+            batches.setdefault(coordinator, []).append(unique_id)
+
+        await asyncio.gather(
+            *(coordinator.async_get_statuses(device_ids, call.data[ATTR_MAX_AGE])
+              for coordinator, device_ids in batches.items())
+        )
+        now = time.monotonic()
+        response: dict[str, Any] = {}
+        for device, (unique_id, coordinator) in resolved.items():
+            state = coordinator.data.get(unique_id) if coordinator.data else None
+            updated_at = coordinator.updated_at.get(unique_id)
+            response[device] = {
+                "status": state.as_status() if state is not None else None,
+                "age": round(now - updated_at, 1) if updated_at is not None else None,
+            }
+
+        if ATTR_DEVICE_ID in call.data:
+            device_id, _ = resolved[call.data[ATTR_DEVICE_ID]]
+            hass.states.async_set(
+                f"{DOMAIN}.{device_id}_status", "retrieved", response[call.data[ATTR_DEVICE_ID]]["status"]
+            )
+        return {"devices": response}
+
+    async def set_many(call: ServiceCall) -> ServiceResponse:
+        """Send the same target state to many devices at once."""
+        command = _build_command(call.data)
+        batches: dict[ConnectMeshCoordinator, dict[str, dict[str, Any]]] = {}
+        for device in call.data[ATTR_DEVICES]:
+            unique_id, coordinator = resolve_device(device)
+            batches.setdefault(coordinator, {})[unique_id] = command
+
+        results: dict[str, bool] = {}
+        for batch_results in await asyncio.gather(
+            *(coordinator.async_set_many(commands) for coordinator, commands in batches.items())
+        ):
+            results.update(batch_results)
+        return {"results": results}
+
+    async def snapshot(call: ServiceCall) -> ServiceResponse:
+        """Save the confirmed state of devices under a name."""
+        states = {}
+        unconfirmed = []
+        for unique_id, coordinator in resolve_devices(call.data.get(ATTR_DEVICES)).items():
+            if (state := coordinator.confirmed_state(unique_id)) is not None:
+                states[unique_id] = state
+            elif (coordinator.data or {}).get(unique_id) is not None:
+                # Only shows what a command still being verified should do
+                unconfirmed.append(unique_id)
+        saved = await scenes.async_set(call.data[ATTR_SNAPSHOT_ID], states)
+        return {"devices": saved, "unconfirmed": unconfirmed}
+
+    async def restore(call: ServiceCall) -> ServiceResponse:
+        """Bring devices back to a snapshot, commanding only those that differ."""
+        saved = await scenes.async_get(call.data[ATTR_SNAPSHOT_ID])
+        if saved is None:
+            raise ServiceValidationError(f"Unknown snapshot: {call.data[ATTR_SNAPSHOT_ID]}")
+        if ATTR_DEVICES in call.data:
+            targets = resolve_devices(call.data[ATTR_DEVICES])
+        else:
+            targets = {
+                unique_id: coordinator
+                for unique_id in saved
+                if (coordinator := registry.async_find_coordinator(unique_id)) is not None
+            }
+        batches: dict[ConnectMeshCoordinator, dict[str, DeviceState]] = {}
+        for unique_id, coordinator in targets.items():
+            if unique_id in saved:
+                batches.setdefault(coordinator, {})[unique_id] = saved[unique_id]
+
+        results: dict[str, bool] = {}
+        for batch_results in await asyncio.gather(
+            *(coordinator.async_restore(states) for coordinator, states in batches.items())
+        ):
+            results.update(batch_results)
+        unchanged = [
+            unique_id for states in batches.values() for unique_id in states if unique_id not in results
+        ]
+        return {"results": results, "unchanged": unchanged}
+
+    async def record_traffic(call: ServiceCall) -> ServiceResponse:
+        """Record the cloud traffic for a while, then write it to a trace file."""
+        if registry.recorder is not None:
+            raise ServiceValidationError("Connect Mesh traffic is already being recorded")
+        path = Path(hass.config.path(f"{DOMAIN}_trace_{dt_util.now():%Y%m%d_%H%M%S}.jsonl.gz"))
+        # Written early if Home Assistant stops or the last entry is unloaded
+        registry.async_start_recording(path, call.data[ATTR_DURATION])
+        return {"path": str(path), "duration": call.data[ATTR_DURATION]}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_DEVICE_STATUS,
+        get_device_status,
+        schema=GET_DEVICE_STATUS_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SET_MANY,
+        set_many,
+        schema=SET_MANY_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SNAPSHOT,
+        snapshot,
+        schema=SNAPSHOT_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_RESTORE,
+        restore,
+        schema=SNAPSHOT_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_RECORD_TRAFFIC,
+        record_traffic,
+        schema=RECORD_TRAFFIC_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+
+def async_unload_services(hass: HomeAssistant) -> None:
+    """Remove the integration services."""
+    hass.services.async_remove(DOMAIN, SERVICE_GET_DEVICE_STATUS)
+    hass.services.async_remove(DOMAIN, SERVICE_SET_MANY)
+    hass.services.async_remove(DOMAIN, SERVICE_SNAPSHOT)
+    hass.services.async_remove(DOMAIN, SERVICE_RESTORE)
+    hass.services.async_remove(DOMAIN, SERVICE_RECORD_TRAFFIC)
+
+
+def _build_command(data: dict[str, Any]) -> dict[str, Any]:
+    """Convert Home Assistant light attributes to an API command."""
+    if data.get(ATTR_POWER) is False or data.get(ATTR_BRIGHTNESS) == 0:
+        return {ATTR_POWER: False}
+
+    command: dict[str, Any] = {}
+    if ATTR_BRIGHTNESS in data:
+        command[ATTR_LIGHTNESS] = data[ATTR_BRIGHTNESS] / 255
+    else:
+        command[ATTR_POWER] = True
+    if ATTR_COLOR_TEMP_KELVIN in data:
+        command[ATTR_TEMPERATURE] = max(MIN_KELVIN, min(MAX_KELVIN, data[ATTR_COLOR_TEMP_KELVIN]))
+    if ATTR_HS_COLOR in data:
+        hue, saturation = data[ATTR_HS_COLOR]
+        command[ATTR_HUE_SATURATION] = (hue / 360 * 65535, saturation / 100)
+    return command
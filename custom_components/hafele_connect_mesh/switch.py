@@ -1,59 +1,46 @@
+"""Platform for switch integration."""
+from __future__ import annotations
+
 import logging
-import aiohttp  # Ensure aiohttp is imported
+from typing import Any
+
 from homeassistant.components.switch import SwitchEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from . import DOMAIN, HafeleConnectMeshDevice
+from .const import ATTR_POWER, DEVICE_TYPE_SWITCH, DOMAIN
+from .entity import ConnectMeshEntity, async_setup_device_entities
 
 _LOGGER = logging.getLogger(__name__)
 
-async def async_setup_entry(hass, config_entry, async_add_entities):
+async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, async_add_entities: AddEntitiesCallback) -> None:
     """Set up Häfele Connect Mesh switches from a config entry."""
-    config = hass.data[DOMAIN][config_entry.entry_id]
-    api_key = config["api_key"]
-    devices = config["devices"]
+    coordinators = hass.data[DOMAIN][config_entry.entry_id]["coordinators"]
 
-    switches = []
-    for device in devices:
-        if device["type"] not in ["com.haefele.led.white.strip", "com.haefele.led.rgb", "com.haefele.led.white", "com.haefele.led.multiwhite.2700K"]:
-            switches.append(HafeleConnectMeshSwitch(device, api_key))
+    def create_switch(device: dict) -> HafeleConnectMeshSwitch | None:
+        if device["type"] != DEVICE_TYPE_SWITCH:
+            return None
+        return HafeleConnectMeshSwitch(coordinators[device["networkId"]], device)
 
-    async_add_entities(switches, True)
+    async_setup_device_entities(hass, config_entry, async_add_entities, create_switch)
 
-class HafeleConnectMeshSwitch(HafeleConnectMeshDevice, SwitchEntity):
+class HafeleConnectMeshSwitch(ConnectMeshEntity, SwitchEntity):
     """Representation of a Häfele Connect Mesh switch."""
 
     @property
-    def is_on(self):
+    def is_on(self) -> bool | None:
         """Return true if the switch is on."""
-        return self._state
+        return self.device_state.power if self.device_state else None
 
-    async def async_turn_on(self, **kwargs):
+    async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn the switch on."""
-        await self._set_power("on")
+        await self._set_power(True)
 
-    async def async_turn_off(self, **kwargs):
+    async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn the switch off."""
-        await self._set_power("off")
+        await self._set_power(False)
 
-    async def _set_power(self, power):
+    async def _set_power(self, power: bool) -> None:
         """Set the power state of the switch."""
-        headers = {
-            'accept': 'application/json',
-            'Authorization': f'Bearer {self._api_key}',
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            "power": power,
-            "uniqueId": self.unique_id,
-            "acknowledged": True,
-            "retries": 0,
-            "timeout_ms": 10000
-        }
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.put('https://cloud.connect-mesh.io/api/core/devices/power', headers=headers, json=payload) as response:
-                if response.status != 200:
-                    _LOGGER.error("Failed to set power for device %s: %s", self.unique_id, response.status)
-                else:
-                    self._state = power == "on"
-                    self.async_write_ha_state()
+        await self.coordinator.async_send_command(self._attr_unique_id, **{ATTR_POWER: power})
@@ -0,0 +1,126 @@
+"""Traffic recording for Häfele Connect Mesh."""
+from __future__ import annotations
+
+import gzip
+import json
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+from homeassistant.components.diagnostics import REDACTED
+
+from .const import TRACE_FORMAT_VERSION, TRACE_MAX_ENTRIES
+
+# Keys holding identifiers, with the kind of alias that replaces them
+ID_KEYS = {"uniqueId": "device", "deviceId": "device", "networkId": "network", "id": "network"}
+NAME_KEYS = {"name"}
+SECRET_KEYS = ("token", "secret", "password", "authorization")
+
+
+class TrafficRecorder:
+    """Record the requests of API clients for offline replay.
+
+    Every attempt is kept with its start time relative to the recording,
+    its latency, status and JSON bodies. Headers are not recorded, secrets
+    in bodies are redacted, and device and network IDs and names are
+    replaced by stable aliases such as ``device-3``, so a trace keeps the
+    shape of the traffic without exposing the account. At most
+    ``max_entries`` attempts are kept; later ones are only counted.
+    """
+
+    def __init__(self, max_entries: int = TRACE_MAX_ENTRIES):
+        """Start recording."""
+        self.started = time.monotonic()
+        self.max_entries = max_entries
+        self.entries: list[dict[str, Any]] = []
+        self.dropped = 0
+        self._aliases: dict[str, str] = {}
+        self._alias_counts: Counter[str] = Counter()
+
+    def alias(self, value: Any, kind: str) -> str:
+        """Return the alias of an identifier, the same every time it is seen."""
+        key = str(value)
+        if (alias := self._aliases.get(key)) is None:
+            self._alias_counts[kind] += 1
+            alias = self._aliases[key] = f"{kind}-{self._alias_counts[kind]}"
+        return alias
+
+    def redact(self, data: Any) -> Any:
+        """Return a JSON body with its identifiers aliased and secrets removed."""
+        if isinstance(data, list):
+            return [self.redact(item) for item in data]
+        if not isinstance(data, dict):
+            return data
+        redacted = {}
+        for key, value in data.items():
+            if any(secret in key.lower() for secret in SECRET_KEYS):
+                redacted[key] = REDACTED
+            elif key in ID_KEYS and isinstance(value, (str, int)):
+                redacted[key] = self.alias(value, ID_KEYS[key])
+            elif key in NAME_KEYS and isinstance(value, str):
+                redacted[key] = self.alias(value, "name")
+            else:
+                redacted[key] = self.redact(value)
+        return redacted
+
+    def redact_path(self, path: str) -> str:
+        """Return a request path with the device ID aliased."""
+        parts = path.split("/")
+        if len(parts) == 4 and parts[1] == "devices":
+            parts[2] = self.alias(parts[2], "device")
+        return "/".join(parts)
+
+    def record(
+        self,
+        method: str,
+        path: str,
+        priority: str,
+        attempt: int,
+        started: float,
+        latency: float,
+        status: int,
+        request: Any = None,
+        response: Any = None,
+        error: str | None = None,
+    ) -> None:
+        """Record one attempt of a request."""
+        if len(self.entries) >= self.max_entries:
+            self.dropped += 1
+            return
+        entry: dict[str, Any] = {
+            "t": round(started - self.started, 3),
+            "method": method,
+            "path": self.redact_path(path),
+            "priority": priority,
+            "status": status,
+            "latency": round(latency, 3),
+        }
+        if attempt:
+            entry["attempt"] = attempt
+        if error is not None:
+            entry["error"] = error
+        if request is not None:
+            entry["request"] = self.redact(request)
+        if response is not None:
+            entry["response"] = self.redact(response)
+        self.entries.append(entry)
+
+    def write(self, path: Path) -> int:
+        """Write the trace as gzipped JSON lines and return the attempts written.
+
+        The first line describes the recording, each next one is an attempt,
+        in the order they started.
+        Does blocking I/O.
+        """
+        header = {
+            "version": TRACE_FORMAT_VERSION,
+            "duration": round(time.monotonic() - self.started, 3),
+            "entries": len(self.entries),
+            "dropped": self.dropped,
+        }
+        with gzip.open(path, "wt", encoding="utf-8") as file:
+            for line in (header, *sorted(self.entries, key=lambda entry: entry["t"])):
+                file.write(json.dumps(line, separators=(",", ":")) + "\n")
+        return len(self.entries)
+
@@ -0,0 +1,37 @@
+"""Pooled HTTP transport for the Connect Mesh cloud."""
+from __future__ import annotations
+
+import aiohttp
+from homeassistant.const import __version__ as HA_VERSION
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.json import json_dumps
+from homeassistant.util import ssl as ssl_util
+
+from .const import (
+    CONNECTION_LIMIT,
+    CONNECTION_LIMIT_PER_HOST,
+    DNS_CACHE_TTL,
+    KEEPALIVE_TIMEOUT,
+)
+
+
+@callback
+def async_create_transport(hass: HomeAssistant) -> aiohttp.ClientSession:
+    """Create the session shared by every Connect Mesh request.
+
+    Connections to the cloud are kept alive between poll cycles, DNS answers
+    are cached and the pool is sized for the concurrent status fetches.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTION_LIMIT,
+        limit_per_host=CONNECTION_LIMIT_PER_HOST,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        enable_cleanup_closed=True,
+        ssl=ssl_util.get_default_context(),
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        json_serialize=json_dumps,
+        headers={"User-Agent": f"HomeAssistant/{HA_VERSION} hafele_connect_mesh"},
+    )
@@ -0,0 +1,25 @@
+"""Tests for the Häfele Connect Mesh integration."""
+from __future__ import annotations
+
+from custom_components.hafele_connect_mesh.const import API_BASE_URL
+
+NETWORK_ID = "network-1"
+
+
+def mock_status(aioclient_mock, unique_id: str, **state) -> None:
+    """Answer the status reads of a device with a state, on at full lightness by default."""
+    aioclient_mock.get(
+        f"{API_BASE_URL}/devices/{unique_id}/status",
+        json={"abstraction": "Light", "state": {"power": True, "lightness": 65535, **state}},
+    )
+
+
+def mock_commands(aioclient_mock) -> None:
+    """Accept every command."""
+    for command in ("power", "lightness", "temperature", "hue_saturation"):
+        aioclient_mock.put(f"{API_BASE_URL}/devices/{command}", json={})
+
+
+def sent_commands(aioclient_mock, since: int = 0) -> list[dict]:
+    """Return the bodies of the commands sent after the first ``since`` requests."""
+    return [body for method, _, body, _ in aioclient_mock.mock_calls[since:] if method == "PUT"]
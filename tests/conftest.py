@@ -0,0 +1,59 @@
+"""Fixtures for the Häfele Connect Mesh tests."""
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.hafele_connect_mesh.const import DOMAIN
+
+from . import NETWORK_ID, mock_commands, mock_status
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Load the integration from custom_components."""
+    yield
+
+
+@pytest.fixture(autouse=True)
+def mock_transport(aioclient_mock):
+    """Send the integration's requests to the mocked cloud."""
+    with patch(
+        "custom_components.hafele_connect_mesh.coordinator.async_create_transport",
+        side_effect=lambda hass: aioclient_mock.create_session(hass.loop),
+    ):
+        yield
+
+
+@pytest.fixture
+def config_entry(hass) -> MockConfigEntry:
+    """Return a config entry with two lights on one network."""
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        version=3,
+        title="Home",
+        data={
+            "api_token": "token",
+            "network_ids": [NETWORK_ID],
+            "devices": [
+                {"uniqueId": unique_id, "name": f"Light {index}", "type": "brightness", "networkId": NETWORK_ID}
+                for index, unique_id in enumerate(("light-1", "light-2"), start=1)
+            ],
+        },
+    )
+    entry.add_to_hass(hass)
+    return entry
+
+
+@pytest.fixture
+async def coordinator(hass, aioclient_mock, config_entry):
+    """Set up the config entry with both lights on and return its coordinator."""
+    for unique_id in ("light-1", "light-2"):
+        mock_status(aioclient_mock, unique_id)
+    mock_commands(aioclient_mock)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    yield hass.data[DOMAIN][config_entry.entry_id]["coordinators"][NETWORK_ID]
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
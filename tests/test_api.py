@@ -0,0 +1,81 @@
+"""Tests for the Connect Mesh API client."""
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from custom_components.hafele_connect_mesh.api import ConnectMeshAPI
+from custom_components.hafele_connect_mesh.resilience import STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker
+
+
+class StalledSession:
+    """A session whose requests never get an answer."""
+
+    def __init__(self) -> None:
+        """Initialize the session."""
+        self.sent = asyncio.Event()
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs):
+        """Wait forever for the response."""
+        self.sent.set()
+        await asyncio.Event().wait()
+        yield
+
+
+def half_open_client(session: StalledSession, reset_timeout: float = 0) -> ConnectMeshAPI:
+    """Return a client whose circuit lets the next request probe."""
+    api_client = ConnectMeshAPI(session, "token")
+    api_client.circuit_breaker = CircuitBreaker(1, reset_timeout, 60)
+    api_client.circuit_breaker.record_failure()
+    return api_client
+
+
+async def test_cancelled_probe_releases_circuit() -> None:
+    """Test a probe cancelled while waiting for its answer lets the next request probe."""
+    session = StalledSession()
+    api_client = half_open_client(session)
+    probe = asyncio.create_task(api_client.get_device_status("light-1"))
+    await session.sent.wait()
+    assert api_client.circuit_breaker.is_open
+
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert api_client.circuit_breaker.state == STATE_HALF_OPEN
+    assert not api_client.circuit_breaker.is_open
+    assert api_client.circuit_breaker.allow_request()
+
+
+async def test_queued_probe_cancelled_releases_circuit() -> None:
+    """Test a probe cancelled while queued for a slot lets the next request probe."""
+    session = StalledSession()
+    api_client = half_open_client(session)
+    api_client.scheduler.max_in_flight = 0
+    probe = asyncio.create_task(api_client.get_device_status("light-1"))
+    await asyncio.sleep(0)
+    assert api_client.circuit_breaker.is_open
+
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert not api_client.circuit_breaker.is_open
+    assert not session.sent.is_set()
+
+
+async def test_probe_out_of_time_budget_reopens_circuit() -> None:
+    """Test a probe that runs out of its time budget opens the circuit again."""
+    session = StalledSession()
+    api_client = half_open_client(session, reset_timeout=0.01)
+    await asyncio.sleep(0.02)
+
+    with pytest.raises(TimeoutError):
+        await api_client.get_device_status("light-1", timeout=0.01)
+
+    assert api_client.circuit_breaker.state == STATE_OPEN
+    assert api_client.circuit_breaker.reset_timeout == 0.02
+    assert api_client.counters["circuit_opened"] == 1
@@ -0,0 +1,47 @@
+"""Tests for the command helpers."""
+from __future__ import annotations
+
+from custom_components.hafele_connect_mesh.commands import command_for_state, minimal_command
+from custom_components.hafele_connect_mesh.models import DeviceState
+
+
+def test_minimal_command_in_state() -> None:
+    """Test a device already in the commanded state needs no command."""
+    state = DeviceState(power=True, lightness=32768, temperature=3000)
+    assert minimal_command(state, {"lightness": 0.5, "temperature": 3000}) == {}
+    assert minimal_command(state, {"power": True}) == {}
+    assert minimal_command(DeviceState(power=False, lightness=32768), {"power": False}) == {}
+
+
+def test_minimal_command_keeps_what_differs() -> None:
+    """Test only the attributes a device does not show are kept."""
+    state = DeviceState(power=True, lightness=32768, temperature=3000)
+    assert minimal_command(state, {"lightness": 0.5, "temperature": 4000}) == {"temperature": 4000}
+    assert minimal_command(state, {"power": False}) == {"power": False}
+    assert minimal_command(None, {"power": True}) == {"power": True}
+
+
+def test_minimal_command_turns_device_on() -> None:
+    """Test a device that is off is turned on, at the commanded lightness if any."""
+    state = DeviceState(power=False, lightness=32768, temperature=3000)
+    assert minimal_command(state, {"power": True}) == {"power": True}
+    assert minimal_command(state, {"lightness": 0.5, "temperature": 3000}) == {"lightness": 0.5}
+
+
+def test_minimal_command_tolerance() -> None:
+    """Test a lightness within half a brightness step matches, anything else does not."""
+    state = DeviceState(power=True, lightness=32768, temperature=3000, hue=100, saturation=65535)
+    assert minimal_command(state, {"lightness": 32868 / 65535}) == {}
+    assert minimal_command(state, {"lightness": 33000 / 65535}) == {"lightness": 33000 / 65535}
+    assert minimal_command(state, {"temperature": 3010}) == {"temperature": 3010}
+    assert minimal_command(state, {"hue_saturation": (101, 1.0)}) == {"hue_saturation": (101, 1.0)}
+
+
+def test_command_for_state_round_trip() -> None:
+    """Test the command for a state is not needed by a device in that state."""
+    for state in (
+        DeviceState(power=False, lightness=1000),
+        DeviceState(power=True, lightness=12345, temperature=4000),
+        DeviceState(power=True, lightness=65535, hue=20000, saturation=30000),
+    ):
+        assert minimal_command(state, command_for_state(state)) == {}
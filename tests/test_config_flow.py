@@ -0,0 +1,69 @@
+"""Tests for the Häfele Connect Mesh config flow."""
+from __future__ import annotations
+
+from homeassistant import config_entries, data_entry_flow
+
+from custom_components.hafele_connect_mesh.const import API_BASE_URL, DOMAIN
+from custom_components.hafele_connect_mesh.coordinator import async_get_registry
+
+from . import NETWORK_ID, mock_status
+
+
+async def async_start_flow(hass, aioclient_mock) -> dict:
+    """Start a config flow and enter a token, which shows the network form."""
+    aioclient_mock.get(f"{API_BASE_URL}/networks", json=[{"id": NETWORK_ID, "name": "Home"}])
+    result = await hass.config_entries.flow.async_init(DOMAIN, context={"source": config_entries.SOURCE_USER})
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], {"api_token": "token"})
+    assert result["type"] == data_entry_flow.FlowResultType.FORM
+    assert result["step_id"] == "select_network"
+    return result
+
+
+async def test_aborted_flow_releases_api_client(hass, aioclient_mock):
+    """An abandoned flow leaves no client or session behind."""
+    result = await async_start_flow(hass, aioclient_mock)
+    registry = async_get_registry(hass)
+    assert registry.api_clients
+
+    hass.config_entries.flow.async_abort(result["flow_id"])
+    await hass.async_block_till_done()
+
+    assert not registry.api_clients
+    assert not registry.request_schedulers
+    assert registry._session is None
+
+
+async def test_flow_failing_to_connect_releases_api_client(hass, aioclient_mock):
+    """A flow aborted because the cloud fails releases its client."""
+    result = await async_start_flow(hass, aioclient_mock)
+    aioclient_mock.get(f"{API_BASE_URL}/devices", status=500)
+
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], {"networks": [NETWORK_ID]})
+    await hass.async_block_till_done()
+
+    assert result["type"] == data_entry_flow.FlowResultType.ABORT
+    assert result["reason"] == "cannot_connect"
+    assert not async_get_registry(hass).api_clients
+
+
+async def test_created_entry_keeps_api_client(hass, aioclient_mock):
+    """The entry created by a flow keeps using the flow's client and session."""
+    result = await async_start_flow(hass, aioclient_mock)
+    aioclient_mock.get(
+        f"{API_BASE_URL}/devices",
+        json=[{"uniqueId": "light-1", "name": "Light 1", "networkId": NETWORK_ID}],
+    )
+    mock_status(aioclient_mock, "light-1")
+
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], {"networks": [NETWORK_ID]})
+    assert result["type"] == data_entry_flow.FlowResultType.SHOW_PROGRESS
+    await hass.async_block_till_done()
+    result = await hass.config_entries.flow.async_configure(result["flow_id"])
+    assert result["type"] == data_entry_flow.FlowResultType.CREATE_ENTRY
+    await hass.async_block_till_done()
+
+    registry = async_get_registry(hass)
+    assert ("token", None) in registry.api_clients
+    assert ("token", NETWORK_ID) in registry.api_clients
+    assert registry._session is not None
+    assert await hass.config_entries.async_unload(result["result"].entry_id)
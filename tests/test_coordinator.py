@@ -0,0 +1,87 @@
+"""Tests for the Häfele Connect Mesh coordinator."""
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+from pytest_homeassistant_custom_component.test_util.aiohttp import AiohttpClientMockResponse
+
+from custom_components.hafele_connect_mesh.const import API_BASE_URL, CONF_FAST_COMMANDS, DOMAIN
+
+from . import NETWORK_ID, mock_status, sent_commands
+
+COORDINATOR = "custom_components.hafele_connect_mesh.coordinator"
+
+
+async def test_resend_not_overtaken(hass, aioclient_mock, config_entry) -> None:
+    """Test a newer command waits for the resend of an older one to the same device."""
+    hass.config_entries.async_update_entry(config_entry, options={CONF_FAST_COMMANDS: True})
+    for unique_id in ("light-1", "light-2"):
+        mock_status(aioclient_mock, unique_id)
+    resend_sent = asyncio.Event()
+    resend_answered = asyncio.Event()
+
+    async def power(method, url, data) -> AiohttpClientMockResponse:
+        if len(sent_commands(aioclient_mock)) == 2:
+            resend_sent.set()
+            await resend_answered.wait()
+        return AiohttpClientMockResponse(method, url, json={})
+
+    aioclient_mock.put(f"{API_BASE_URL}/devices/power", side_effect=power)
+    aioclient_mock.put(f"{API_BASE_URL}/devices/lightness", json={})
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]["coordinators"][NETWORK_ID]
+
+    with (
+        patch(f"{COORDINATOR}.DEFAULT_COMMAND_WINDOW", 0),
+        patch(f"{COORDINATOR}.VERIFY_DELAYS_UNACKNOWLEDGED", (0, 60)),
+    ):
+        # The device still reports on after the first read, so the command is resent
+        await hass.services.async_call("light", "turn_off", {"entity_id": "light.light_1"}, blocking=True)
+        await asyncio.wait_for(resend_sent.wait(), 5)
+        turn_on = hass.async_create_task(
+            hass.services.async_call(
+                "light", "turn_on", {"entity_id": "light.light_1", "brightness": 255}, blocking=True
+            )
+        )
+        await asyncio.sleep(0.05)
+        assert len(sent_commands(aioclient_mock)) == 2
+
+        resend_answered.set()
+        await turn_on
+
+    assert coordinator.command_resends == 1
+    assert [(body["uniqueId"], body.get("power"), body.get("lightness")) for body in sent_commands(aioclient_mock)] == [
+        ("light-1", "off", None),
+        ("light-1", "off", None),
+        ("light-1", None, 1.0),
+    ]
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+
+async def test_resends_stop_without_progress(hass, aioclient_mock, config_entry) -> None:
+    """Test a missed command is not resent again when the resend changed nothing."""
+    hass.config_entries.async_update_entry(config_entry, options={CONF_FAST_COMMANDS: True})
+    for unique_id in ("light-1", "light-2"):
+        mock_status(aioclient_mock, unique_id)
+    aioclient_mock.put(f"{API_BASE_URL}/devices/power", json={})
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]["coordinators"][NETWORK_ID]
+    requests = aioclient_mock.call_count
+
+    with (
+        patch(f"{COORDINATOR}.DEFAULT_COMMAND_WINDOW", 0),
+        patch(f"{COORDINATOR}.VERIFY_DELAYS_UNACKNOWLEDGED", (0, 0, 0, 0)),
+    ):
+        await hass.services.async_call("light", "turn_off", {"entity_id": "light.light_1"}, blocking=True)
+        async with asyncio.timeout(5):
+            # The last verification read gives up on the command
+            while hass.states.get("light.light_1").state != "on":
+                await asyncio.sleep(0.01)
+
+    assert [method for method, *_ in aioclient_mock.mock_calls[requests:]].count("GET") == 4
+    assert coordinator.command_resends == 1
+    assert len(sent_commands(aioclient_mock, requests)) == 2
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
@@ -0,0 +1,39 @@
+"""Tests for the request scheduling and circuit breaking helpers."""
+from __future__ import annotations
+
+from custom_components.hafele_connect_mesh.resilience import STATE_HALF_OPEN, CircuitBreaker
+
+
+def test_circuit_breaker_lets_one_probe_through() -> None:
+    """Test a half-open circuit rejects requests while its probe is in flight."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0, max_reset_timeout=0)
+    assert breaker.record_failure()
+
+    assert breaker.allow_request()
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.is_open
+    assert not breaker.allow_request()
+
+
+def test_circuit_breaker_released_probe() -> None:
+    """Test the next request probes once the probe was abandoned."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0, max_reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow_request()
+
+    breaker.release_probe()
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.is_open
+    assert breaker.allow_request()
+
+
+def test_circuit_breaker_release_without_probe() -> None:
+    """Test releasing a probe leaves a closed or open circuit alone."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, max_reset_timeout=60)
+    breaker.release_probe()
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    breaker.release_probe()
+    assert breaker.is_open
+    assert not breaker.allow_request()
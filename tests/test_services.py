@@ -0,0 +1,102 @@
+"""Tests for the Häfele Connect Mesh services."""
+from __future__ import annotations
+
+import gzip
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+
+from custom_components.hafele_connect_mesh.const import DEFAULT_STATUS_MAX_AGE, DOMAIN
+from custom_components.hafele_connect_mesh.coordinator import async_get_registry
+
+from . import mock_commands, mock_status, sent_commands
+
+
+async def async_call(hass, service: str, **data) -> dict:
+    """Call a service of the integration and return its response."""
+    return await hass.services.async_call(DOMAIN, service, data, blocking=True, return_response=True)
+
+
+def read_trace(path: str) -> tuple[dict, list[dict]]:
+    """Return the header and attempts of a trace file."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        header, *entries = (json.loads(line) for line in file)
+    return header, entries
+
+
+async def test_restore_unchanged(hass, aioclient_mock, coordinator) -> None:
+    """Test restoring devices that show their saved state sends nothing."""
+    response = await async_call(hass, "snapshot", snapshot_id="evening")
+    assert set(response["devices"]) == {"light-1", "light-2"}
+    requests = aioclient_mock.call_count
+
+    response = await async_call(hass, "restore", snapshot_id="evening")
+
+    assert response["results"] == {}
+    assert set(response["unchanged"]) == {"light-1", "light-2"}
+    assert aioclient_mock.call_count == requests
+
+
+async def test_restore_reads_old_statuses(hass, aioclient_mock, coordinator) -> None:
+    """Test statuses too old to trust are read before restoring, and only what differs is sent."""
+    await async_call(hass, "snapshot", snapshot_id="evening")
+    for unique_id in coordinator.updated_at:
+        coordinator.updated_at[unique_id] -= DEFAULT_STATUS_MAX_AGE + 1
+    aioclient_mock.clear_requests()
+    mock_status(aioclient_mock, "light-1")
+    mock_status(aioclient_mock, "light-2", power=False)
+    mock_commands(aioclient_mock)
+
+    response = await async_call(hass, "restore", snapshot_id="evening")
+
+    assert response == {"results": {"light-2": True}, "unchanged": ["light-1"]}
+    assert [method for method, *_ in aioclient_mock.mock_calls].count("GET") == 2
+    assert [(body["uniqueId"], body["lightness"]) for body in sent_commands(aioclient_mock)] == [("light-2", 1.0)]
+
+
+async def test_snapshot_leaves_out_unconfirmed_commands(hass, aioclient_mock, coordinator) -> None:
+    """Test a device showing a command that is not confirmed yet is not snapshotted."""
+    with patch("custom_components.hafele_connect_mesh.coordinator.DEFAULT_COMMAND_WINDOW", 0):
+        await hass.services.async_call("light", "turn_off", {"entity_id": "light.light_1"}, blocking=True)
+    assert hass.states.get("light.light_1").state == "off"
+
+    response = await async_call(hass, "snapshot", snapshot_id="evening")
+
+    assert set(response["devices"]) == {"light-2"}
+    assert response["unconfirmed"] == ["light-1"]
+    # The optimistic state is not trusted to trim commands either
+    assert coordinator.async_minimal_command("light-1", {"power": False}) == {"power": False}
+
+
+async def test_record_traffic_written_on_unload(hass, aioclient_mock, config_entry, tmp_path: Path) -> None:
+    """Test a recording is written when the last entry is unloaded before it ends."""
+    hass.config.config_dir = str(tmp_path)
+    for unique_id in ("light-1", "light-2"):
+        mock_status(aioclient_mock, unique_id)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    response = await async_call(hass, "record_traffic", duration=600)
+    await async_call(hass, "get_device_status", devices=["light-1"], max_age=0)
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    assert async_get_registry(hass).recorder is None
+    header, entries = read_trace(response["path"])
+    assert header["entries"] == len(entries) == 1
+    assert entries[0]["path"] == "/devices/device-1/status"
+
+
+async def test_record_traffic_written_on_stop(hass, coordinator, tmp_path: Path) -> None:
+    """Test a recording is written when Home Assistant stops before it ends."""
+    hass.config.config_dir = str(tmp_path)
+    response = await async_call(hass, "record_traffic", duration=600)
+
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_STOP)
+    await hass.async_block_till_done()
+
+    assert async_get_registry(hass).recorder is None
+    header, _ = read_trace(response["path"])
+    assert header["duration"] < 600